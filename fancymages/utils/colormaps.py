@@ -0,0 +1,52 @@
+
+import numpy as np
+
+# ----------------------------------------
+
+# evenly spaced control points, expanded once into 256-entry lookup tables
+
+CONTROL_POINTS = {"viridis": ["#440154", "#482878", "#3e4989", "#31688e", "#26828e", "#1f9e89", "#35b779", "#6ece58", "#b5de2b", "#fde725"],
+                  "inferno": ["#000004", "#1b0c41", "#4a0c6b", "#781c6d", "#a52c60", "#cf4446", "#ed6925", "#fb9b06", "#f7d13d", "#fcffa4"],
+                  "magma": ["#000004", "#180f3d", "#440f76", "#721f81", "#9e2f7f", "#cd4071", "#f1605d", "#fd9668", "#feca8d", "#fcfdbf"],
+                  "turbo": ["#30123b", "#4662d7", "#36aaf9", "#1ae4b6", "#72fe5e", "#c8ef34", "#faba39", "#f66b19", "#ca2a04", "#7a0403"],
+                  "jet": ["#000080", "#0000ff", "#0080ff", "#00ffff", "#80ff80", "#ffff00", "#ff8000", "#ff0000", "#800000"],
+                  "hot": ["#000000", "#ff0000", "#ffff00", "#ffffff"],
+                  "gray": ["#000000", "#ffffff"]}
+
+lookup_tables = dict()
+
+def hex_to_rgb(value):
+
+    return [int(value[i:i+2], 16) for i in (1, 3, 5)]
+
+def build_lut(points):
+
+    points = np.array([hex_to_rgb(p) if isinstance(p, str) else p for p in points], dtype=np.float32)
+    positions = np.linspace(0, 255, len(points))
+    steps = np.arange(256)
+
+    channels = [np.interp(steps, positions, points[:, c]) for c in range(3)]
+
+    return np.round(np.stack(channels, axis=1)).astype(np.uint8)
+
+def get_colormap(name):
+
+    # a name from CONTROL_POINTS, a 256x3 table, or a list of control colors
+
+    if not isinstance(name, str):
+
+        if all(isinstance(p, str) for p in name):
+            return build_lut(name)
+
+        table = np.asarray(name, dtype=np.uint8)
+
+        return table if table.shape == (256, 3) else build_lut(name)
+
+    if name not in lookup_tables:
+
+        if name not in CONTROL_POINTS:
+            raise ValueError(f"unknown colormap {name}, use one of {', '.join(CONTROL_POINTS)}")
+
+        lookup_tables[name] = build_lut(CONTROL_POINTS[name])
+
+    return lookup_tables[name]
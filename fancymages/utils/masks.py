@@ -0,0 +1,164 @@
+
+from PIL import Image
+import numpy as np
+
+# ----------------------------------------
+
+# every decoder returns (crop, (x0, y0)): a uint8 crop covering only the mask's
+# bounding box plus its offset in the frame, or None for an empty mask
+
+def rle_counts(counts):
+
+    if not isinstance(counts, (str, bytes)):
+        return np.asarray(counts, dtype=np.int64)
+
+    # compressed COCO counts: 5 bits per char, continuation bit 0x20, delta coded from the
+    # third run on (same scheme as pycocotools' rleFrString)
+
+    if isinstance(counts, str):
+        counts = counts.encode("ascii")
+
+    values = list()
+    pos = 0
+
+    while pos < len(counts):
+
+        value = 0
+        shift = 0
+        more = True
+
+        while more:
+            char = counts[pos] - 48
+            value |= (char & 0x1f) << shift
+            more = bool(char & 0x20)
+            pos += 1
+            shift += 5
+            if not more and (char & 0x10):
+                value |= -1 << shift
+
+        if len(values) > 2:
+            value += values[-2]
+
+        values.append(value)
+
+    return np.asarray(values, dtype=np.int64)
+
+def decode_rle(rle):
+
+    height, width = rle["size"]
+    counts = rle_counts(rle["counts"])
+
+    ends = np.cumsum(counts)
+    starts = ends - counts
+
+    # odd runs are foreground, in column-major order
+    starts, ends = starts[1::2], ends[1::2]
+
+    keep = ends > starts
+    starts, ends = starts[keep], ends[keep]
+
+    if len(starts) == 0:
+        return None
+
+    # split the runs at column boundaries, so each piece lives in a single column
+
+    first_col = starts // height
+    last_col = (ends - 1) // height
+    pieces = last_col - first_col + 1
+
+    run = np.repeat(np.arange(len(starts)), pieces)
+    col = first_col[run] + np.arange(len(run)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+
+    row_start = np.maximum(starts[run], col * height) - col * height
+    row_end = np.minimum(ends[run], (col + 1) * height) - col * height
+
+    x0, x1 = int(col.min()), int(col.max()) + 1
+    y0, y1 = int(row_start.min()), int(row_end.max())
+
+    # +1 / -1 at each piece's ends, a cumulative sum fills them in; only the bbox is allocated
+
+    edges = np.zeros((x1 - x0, y1 - y0 + 1), dtype=np.int32)
+
+    np.add.at(edges, (col - x0, row_start - y0), 1)
+    np.add.at(edges, (col - x0, row_end - y0), -1)
+
+    crop = np.cumsum(edges, axis=1)[:, :-1].T > 0
+
+    return crop.astype(np.uint8) * 255, (x0, y0)
+
+class PackedMask:
+
+
+    def __init__(self, bits, shape, bitorder = "big"):
+
+        # bits: np.packbits of the mask along the rows, i.e. shape (H, ceil(W / 8))
+
+        self.bits = np.asarray(bits, dtype=np.uint8)
+        self.shape = tuple(shape)
+        self.bitorder = bitorder
+
+    @classmethod
+    def from_array(cls, mask, bitorder = "big"):
+
+        mask = np.asarray(mask, dtype=bool)
+
+        return cls(np.packbits(mask, axis=1, bitorder=bitorder), mask.shape, bitorder)
+
+    def decode(self):
+
+        rows = np.flatnonzero(self.bits.any(axis=1))
+
+        if len(rows) == 0:
+            return None
+
+        byte_cols = np.flatnonzero(self.bits[rows[0]:rows[-1] + 1].any(axis=0))
+
+        y0, y1 = int(rows[0]), int(rows[-1]) + 1
+        b0, b1 = int(byte_cols[0]), int(byte_cols[-1]) + 1
+
+        # only the bytes inside the bounding rows and columns are unpacked
+
+        crop = np.unpackbits(self.bits[y0:y1, b0:b1], axis=1, bitorder=self.bitorder)
+        crop = crop[:, :min(crop.shape[1], self.shape[1] - b0 * 8)]
+
+        cols = np.flatnonzero(crop.any(axis=0))
+        crop = crop[:, cols[0]:cols[-1] + 1]
+
+        return crop * np.uint8(255), (b0 * 8 + int(cols[0]), y0)
+
+def decode_dense(mask):
+
+    if isinstance(mask, Image.Image):
+
+        mask = mask.convert("L")
+        bbox = mask.getbbox()
+
+        if bbox is None:
+            return None
+
+        return np.asarray(mask.crop(bbox)), bbox[:2]
+
+    mask = np.asarray(mask)
+
+    if mask.dtype == bool:
+        mask = mask.astype(np.uint8) * 255
+
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+
+    if len(rows) == 0:
+        return None
+
+    crop = mask[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+
+    return np.ascontiguousarray(crop, dtype=np.uint8), (int(cols[0]), int(rows[0]))
+
+def decode_mask(mask):
+
+    if isinstance(mask, dict) and "counts" in mask:
+        return decode_rle(mask)
+
+    if isinstance(mask, PackedMask):
+        return mask.decode()
+
+    return decode_dense(mask)
@@ -1,5 +1,8 @@
 
 from difflib import SequenceMatcher
+from PIL import ImageColor
+
+from fancymages.utils.color_names import colors
 
 
 def suggest(dic, word, distance, maxSuggestion=3):
@@ -7,3 +10,25 @@ def suggest(dic, word, distance, maxSuggestion=3):
 
 def similar(a, b):
     return SequenceMatcher(None, a, b).ratio()
+
+
+def resolve_color(value):
+
+    # any color accepted by the styles (name, "transparent", RGB/RGBA tuple) as an RGBA tuple
+
+    if value is None:
+        return None
+
+    if isinstance(value, str):
+
+        if value == "transparent":
+            return (0,0,0,0)
+
+        if value in colors:
+            return tuple(colors[value]) + (255,)
+
+        return ImageColor.getcolor(value, "RGBA")
+
+    value = tuple(int(v) for v in value)
+
+    return value if len(value) == 4 else value + (255,)
@@ -0,0 +1,177 @@
+
+import numpy as np
+
+# ----------------------------------------
+
+# segments are rows of x1, y1, x2, y2; every function here works on all of them at once
+
+def clip_segments(segments, width, height, margin = 0.0):
+
+    # Liang-Barsky against the image rectangle grown by margin, returns (clipped, kept indices)
+
+    x1, y1, x2, y2 = segments.T
+    dx, dy = x2 - x1, y2 - y1
+
+    t0 = np.zeros(len(segments))
+    t1 = np.ones(len(segments))
+    keep = np.ones(len(segments), dtype=bool)
+
+    bounds = ((-dx, x1 + margin), (dx, width - 1 + margin - x1), (-dy, y1 + margin), (dy, height - 1 + margin - y1))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+
+        for p, q in bounds:
+
+            ratio = q / p
+
+            t0 = np.where(p < 0, np.maximum(t0, ratio), t0)
+            t1 = np.where(p > 0, np.minimum(t1, ratio), t1)
+            keep &= ~((p == 0) & (q < 0))
+
+    keep &= t0 <= t1
+
+    clipped = np.stack([x1 + t0 * dx, y1 + t0 * dy, x1 + t1 * dx, y1 + t1 * dy], axis=1)
+
+    return clipped[keep], np.flatnonzero(keep)
+
+def axis_pixels(a1, b1, a2, b2, major_stride, minor_stride, ids, thickness, antialias, indexed, max_samples):
+
+    # segments given as (major, minor) endpoints along a shared major axis, where a flat
+    # pixel index is major * major_stride + minor * minor_stride
+
+    flip = a2 < a1
+    a1, a2 = np.where(flip, a2, a1), np.where(flip, a1, a2)
+    b1, b2 = np.where(flip, b2, b1), np.where(flip, b1, b2)
+
+    extent = a2 - a1
+    slope = np.divide(b2 - b1, extent, out=np.zeros_like(extent), where=extent > 0)
+
+    # the width is measured across the line, along the minor axis it grows with the angle
+    width = thickness * np.sqrt(1.0 + slope * slope)
+
+    starts = np.round(a1).astype(np.int64)
+    counts = np.round(a2).astype(np.int64) - starts + 1
+
+    # the first pixel of each step's span is floor(minor), with minor linear in the step:
+    # the pixel holding the span start (antialiased), the first pixel whose center is in
+    # the span (hard edges), or the pixel nearest to the line (one pixel wide)
+
+    if antialias:
+        bias = 0.5 - width / 2
+        span = int(np.ceil(width.max())) + 2
+    elif thickness > 1:
+        bias = 1.0 - 1e-9 - width / 2
+        span = int(np.ceil(width.max())) + 1
+    else:
+        bias = 0.5
+        span = 1
+
+    minor_start = b1 + (starts - a1) * slope + bias
+    steps = np.arange(span)[:, None]
+
+    # consecutive runs of segments with at most max_samples samples each
+    ends = np.cumsum(counts)
+    cuts = np.searchsorted(ends, np.arange(max_samples, ends[-1], max_samples), side="right")
+
+    for lo, hi in zip(np.concatenate([[0], cuts]), np.concatenate([cuts, [len(a1)]])):
+
+        if hi <= lo:
+            continue
+
+        chunk = counts[lo:hi]
+        index = np.repeat(np.arange(lo, hi), chunk)
+        step = np.arange(len(index)) - np.repeat(np.cumsum(chunk) - chunk, chunk)
+
+        minor = minor_start[index] + step * slope[index]
+        first = np.floor(minor).astype(np.int64)
+
+        flat = (starts[index] + step) * major_stride + first * minor_stride
+        owner = ids[index] if indexed else None
+
+        if span == 1:
+            yield flat, None, owner
+            continue
+
+        # span steps along the first axis, so that the inner loops run over the samples
+        pixels = flat + steps * minor_stride
+
+        if antialias:
+            # overlap of the span with each pixel, from the distance between the span
+            # start (minor - 0.5) and the pixel's right edge (first + step + 0.5)
+            edge = (first - minor + 1.0) + steps
+            coverage = np.minimum(edge, width[index]) - np.maximum(edge - 1.0, 0.0)
+            keep = coverage > 0
+            coverage = np.minimum(coverage[keep], 1.0).astype(np.float32)
+        else:
+            # pixel centers from the span start (minor - 1) up to its end, at least one
+            keep = steps < np.maximum(np.ceil(minor - 1.0 + width[index]) - first, 1)
+            coverage = None
+
+        yield pixels[keep], coverage, np.broadcast_to(owner, pixels.shape)[keep] if indexed else None
+
+def segment_pixels(segments, stride, thickness = 1, antialias = False, indexed = True, max_samples = 1 << 18):
+
+    # yields (flat pixel indices, coverage, segment index) chunks for a row-major buffer
+    # `stride` pixels wide; the caller keeps every pixel in bounds by shifting and padding.
+    # One sample per pixel step along each segment's major axis, spread across the line
+    # width along the minor axis; coverage is None for hard-edged lines, and the segment
+    # index is None unless indexed
+
+    steep = np.abs(segments[:, 3] - segments[:, 1]) > np.abs(segments[:, 2] - segments[:, 0])
+
+    # mostly horizontal segments step along x, mostly vertical ones along y
+    for ids, columns, strides in ((np.flatnonzero(~steep), [0, 1, 2, 3], (1, stride)), (np.flatnonzero(steep), [1, 0, 3, 2], (stride, 1))):
+
+        if len(ids) == 0:
+            continue
+
+        a1, b1, a2, b2 = segments[ids][:, columns].T
+
+        yield from axis_pixels(a1, b1, a2, b2, *strides, ids, thickness, antialias, indexed, max_samples)
+
+def polygon_edges(points, offsets):
+
+    # the closed edges of ragged polygons given as a flat M x 2 buffer plus the P + 1
+    # boundaries of each polygon in it, as x1, y1, x2, y2 rows and their polygon index
+
+    counts = np.diff(offsets)
+    owner = np.repeat(np.arange(len(counts)), counts)
+
+    # each vertex connects to the next one of its polygon, the last one back to the first
+    following = np.arange(1, len(points) + 1)
+    following[offsets[1:][counts > 0] - 1] = offsets[:-1][counts > 0]
+
+    return np.concatenate([points, points[following]], axis=1), owner
+
+def polygon_spans(points, offsets, width, height):
+
+    # even-odd scanline fill of every polygon at once: (rows, x starts, x ends, polygon
+    # index) of the horizontal spans whose pixel centers are inside, rows in 0..height
+    # and x clamped to -1..width
+
+    edges, owner = polygon_edges(points, offsets)
+
+    y_low = np.minimum(edges[:, 1], edges[:, 3])
+    y_high = np.maximum(edges[:, 1], edges[:, 3])
+
+    # an edge crosses the rows whose center y lies in [y_low, y_high), so that shared
+    # vertices are counted once and horizontal edges never
+    first = np.maximum(np.ceil(y_low), 0).astype(np.int64)
+    last = np.minimum(np.ceil(y_high), height).astype(np.int64)
+    counts = np.maximum(last - first, 0)
+
+    index = np.repeat(np.arange(len(edges)), counts)
+    rows = first[index] + np.arange(len(index)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    x1, y1, x2, y2 = edges[index].T
+    crossings = np.clip(x1 + (rows - y1) * (x2 - x1) / (y2 - y1), -1.0, width)
+
+    polygon = owner[index]
+
+    # sorted by polygon, then row, then x (one combined key): every (polygon, row) holds
+    # an even number of crossings, consecutive pairs of which bound the inside spans
+    order = np.argsort((polygon * height + rows) * (width + 2.0) + (crossings + 1.0))
+
+    rows, crossings, polygon = rows[order], crossings[order], polygon[order]
+
+    return rows[0::2], crossings[0::2], crossings[1::2], polygon[0::2]
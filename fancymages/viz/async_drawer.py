@@ -0,0 +1,136 @@
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import threading
+import asyncio
+
+from fancymages.viz.drawing import PRIMITIVES
+from fancymages.viz.encoding import Encoder
+
+# ----------------------------------------
+
+class RenderCancelled(Exception):
+
+    pass
+
+class AsyncDrawer:
+
+
+    def __init__(self, drawer, max_workers = 4, max_pending = 16):
+
+        # the wrapped Drawer is shared by the executor threads, which is safe since
+        # styles travel with each call; frames rendered concurrently must be distinct images
+
+        self.drawer = drawer
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fancymages")
+
+        self.max_pending = max_pending
+        self.slots = None
+        self.pending = 0
+
+        self.encoders = dict()
+
+    async def __aenter__(self):
+
+        return self
+
+    async def __aexit__(self, *exc_info):
+
+        self.close()
+
+    def close(self):
+
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def __getattr__(self, name):
+
+        if name not in PRIMITIVES:
+            raise AttributeError(name)
+
+        async def primitive(*args, **kwargs):
+            return await self.run(getattr(self.drawer, name), *args, **kwargs)
+
+        return primitive
+
+    # ---- execution
+
+    async def run(self, func, *args, **kwargs):
+
+        # at most max_pending calls are queued or running, callers beyond that wait here
+
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.max_pending)
+
+        async with self.slots:
+
+            self.pending += 1
+
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+            finally:
+                self.pending -= 1
+
+    def run_steps(self, image, steps, encode, save_kwargs, cancelled):
+
+        if hasattr(steps, "replay"):
+            steps = [steps.replay]
+
+        for step in steps:
+
+            # a cancelled render stops at the next step instead of finishing the frame
+
+            if cancelled.is_set():
+                raise RenderCancelled()
+
+            if callable(step):
+                image = step(image)
+            else:
+                method, kwargs = step
+                image = getattr(self.drawer, method)(image, **kwargs)
+
+        if encode is None:
+            return image
+
+        if cancelled.is_set():
+            raise RenderCancelled()
+
+        return self.drawer.encode(image, encoder = self.get_encoder(encode, save_kwargs)).data
+
+    def get_encoder(self, encode, save_kwargs):
+
+        # encoders and their pooled buffers are shared by every frame with the same settings
+
+        if isinstance(encode, Encoder):
+            return encode
+
+        key = (encode.upper(), tuple(sorted(save_kwargs.items())))
+
+        if key not in self.encoders:
+            self.encoders[key] = Encoder(encode, **save_kwargs)
+
+        return self.encoders[key]
+
+    async def render(self, image, steps, encode = None, **save_kwargs):
+
+        # steps: a DisplayList, or a sequence of (method name, kwargs) pairs and
+        # callables taking and returning an image; encode: a format name or an Encoder
+
+        cancelled = threading.Event()
+
+        try:
+            return await self.run(self.run_steps, image, steps, encode, save_kwargs, cancelled)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def render_batch(self, frames, steps, encode = None, **save_kwargs):
+
+        tasks = [asyncio.ensure_future(self.render(frame, steps, encode, **save_kwargs)) for frame in frames]
+
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
@@ -0,0 +1,173 @@
+
+from PIL import Image
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from collections import deque
+from io import BytesIO
+import os
+
+from fancymages.viz.drawing import Drawer
+from fancymages.utils.logger import Logger
+
+# ----------------------------------------
+
+EXTENSIONS = {"PNG": ".png", "JPEG": ".jpg", "WEBP": ".webp"}
+
+# state of each worker process, filled once by the pool initializer
+
+worker_state = dict()
+
+def replay_annotations(drawer, image, annotations):
+
+    # lists recorded with shared_styles replay on the worker Drawer and its styles;
+    # the others carry their own style snapshots with every item
+
+    return annotations.replay(image, drawer = drawer)
+
+def init_worker(styles, style_name, render, output_format, save_kwargs, output_dir, logging_level):
+
+    drawer = Drawer(logger = Logger(logging_level))
+
+    for name, entries in styles.items():
+        drawer.add_style(name, entries)
+
+    if style_name is not None:
+        drawer.set_style(style_name)
+
+    worker_state.update(drawer = drawer,
+                        render = render,
+                        output_format = output_format,
+                        save_kwargs = save_kwargs,
+                        output_dir = output_dir)
+
+def output_name(path, index, output_format):
+
+    # the item index keeps inputs with the same file name in different folders apart
+
+    stem = os.path.splitext(os.path.basename(path))[0]
+
+    return f"{index:06d}-{stem}" + EXTENSIONS.get(output_format, "." + output_format.lower())
+
+def render_item(index, path, annotations):
+
+    # decode -> draw -> encode, all inside the worker
+
+    with Image.open(path) as source:
+        image = source.convert("RGB")
+
+    result = worker_state["render"](worker_state["drawer"], image, annotations)
+
+    output_format = worker_state["output_format"]
+
+    if output_format == "JPEG" and result.mode != "RGB":
+        result = result.convert("RGB")
+
+    if worker_state["output_dir"] is not None:
+
+        output = os.path.join(worker_state["output_dir"], output_name(path, index, output_format))
+
+        result.save(output, output_format, **worker_state["save_kwargs"])
+
+        return output
+
+    buffer = BytesIO()
+    result.save(buffer, output_format, **worker_state["save_kwargs"])
+
+    return buffer.getvalue()
+
+# ----------------------------------------
+
+class BatchRenderer:
+
+
+    def __init__(self, drawer, render = replay_annotations, processes = None, max_in_flight = None, ordered = True, output_format = "PNG", save_kwargs = None, output_dir = None, progress = None):
+
+        self.drawer = drawer
+        self.render_fn = render
+
+        self.processes = processes if processes is not None else os.cpu_count()
+        self.max_in_flight = max_in_flight if max_in_flight is not None else 2 * max(self.processes, 1)
+        self.ordered = ordered
+
+        self.output_format = output_format.upper()
+        self.save_kwargs = save_kwargs if save_kwargs is not None else dict()
+        self.output_dir = output_dir
+
+        self.progress = progress
+
+    def worker_args(self):
+
+        # styles registered on the parent Drawer travel once per worker, not once per image
+
+        styles = {name: params.as_dict() for name, params in self.drawer.drawing_styles.items()}
+
+        return (styles, self.drawer.cur_style, self.render_fn, self.output_format, self.save_kwargs, self.output_dir, self.drawer.logger.logging_level)
+
+    def report(self, done, total):
+
+        if self.progress is not None:
+            self.progress(done, total)
+
+    def render(self, items):
+
+        total = len(items) if hasattr(items, "__len__") else None
+
+        if self.output_dir is not None:
+            os.makedirs(self.output_dir, exist_ok=True)
+
+        if self.processes == 0:
+            yield from self.render_serial(items, total)
+            return
+
+        done = 0
+
+        with ProcessPoolExecutor(max_workers=self.processes, initializer=init_worker, initargs=self.worker_args()) as executor:
+
+            pending = deque()
+
+            for index, (path, annotations) in enumerate(items):
+
+                while len(pending) >= self.max_in_flight:
+                    for result in self.collect(pending):
+                        done += 1
+                        self.report(done, total)
+                        yield result
+
+                pending.append((path, executor.submit(render_item, index, path, annotations)))
+
+            while pending:
+                for result in self.collect(pending):
+                    done += 1
+                    self.report(done, total)
+                    yield result
+
+    def collect(self, pending):
+
+        if self.ordered:
+
+            path, future = pending.popleft()
+
+            return [(path, future.result())]
+
+        finished, _ = wait([future for _, future in pending], return_when=FIRST_COMPLETED)
+
+        results = [(path, future.result()) for path, future in pending if future in finished]
+        remaining = [(path, future) for path, future in pending if future not in finished]
+
+        pending.clear()
+        pending.extend(remaining)
+
+        return results
+
+    def render_serial(self, items, total):
+
+        # processes = 0 runs everything in the calling process, handy for debugging
+
+        init_worker(*self.worker_args())
+
+        for done, (path, annotations) in enumerate(items):
+
+            result = render_item(done, path, annotations)
+
+            self.report(done + 1, total)
+
+            yield path, result
@@ -0,0 +1,319 @@
+
+from PIL import Image
+import numpy as np
+import inspect
+
+from fancymages.viz.drawing import Drawer, PRIMITIVES
+from fancymages.utils.logger import Logger
+from fancymages.utils.processing import resolve_color
+from fancymages.utils.masks import PackedMask, decode_mask
+
+# ----------------------------------------
+
+RECORDABLE = PRIMITIVES
+
+# coordinates scaled on scaled replays; masks and label maps are resized to the replayed
+# image, heat maps and flow fields are mapped onto it by the primitives themselves
+
+GEOMETRY_FIELDS = ("point_tl", "point_br", "points", "segments", "joints", "boxes", "coords", "people")
+
+COLOR_FIELDS = ("color", "text_color")
+
+# style sizes scaled with the geometry on scaled replays, fonts stay readable
+
+SIZE_FIELDS = ("line thickness", "points size", "points outline thickness", "arrow thickness")
+
+MIN_FONT_SIZE = 8
+
+class DisplayList:
+
+
+    def __init__(self, drawer, shared_styles = False):
+
+        # shared_styles: operations reference the Drawer's styles by name instead of carrying
+        # snapshots, for lists replayed on a Drawer that registers the same styles (e.g. the
+        # BatchRenderer workers, which receive them once)
+
+        self.drawer = drawer
+        self.shared_styles = shared_styles
+
+        self.styles = dict()
+        self.operations = list()
+
+        self.replay_drawers = dict()
+
+    def __len__(self):
+
+        return len(self.operations)
+
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+        state["drawer"] = None
+        state["replay_drawers"] = dict()
+
+        return state
+
+    def __getattr__(self, name):
+
+        if name not in RECORDABLE:
+            raise AttributeError(name)
+
+        def recorder(*args, **kwargs):
+            self.record(name, *args, **kwargs)
+            return self
+
+        return recorder
+
+    # ---- recording
+
+    def snapshot_style(self, style_name):
+
+        if self.drawer is None:
+            raise RuntimeError("display list is not bound to a Drawer, recording is not possible")
+
+        style_name = style_name if style_name is not None else self.drawer.cur_style
+
+        if self.shared_styles:
+            return style_name
+
+        params = self.drawer.drawing_styles[style_name]
+
+        resolved = {key: resolve_color(value) if "color" in key else value for key, value in params.as_dict().items()}
+
+        # styles are stored once, identical snapshots share the same key
+
+        for key, style in self.styles.items():
+            if style == resolved:
+                return key
+
+        key = f"display-list-{len(self.styles)}"
+        self.styles[key] = resolved
+
+        return key
+
+    def record(self, method, *args, **kwargs):
+
+        signature = inspect.signature(getattr(Drawer, method))
+        arguments = signature.bind_partial(None, None, *args, **kwargs).arguments
+
+        arguments.pop("self")
+        arguments.pop("image", None)
+
+        style_key = self.snapshot_style(arguments.pop("apply_style", None))
+
+        # ragged polygons are stored as one flat vertex buffer and its boundaries
+        if method == "polygons":
+            arguments["points"], arguments["offsets"] = self.drawer.ragged_points(arguments["points"], arguments.get("offsets"))
+
+        for field in GEOMETRY_FIELDS:
+            if arguments.get(field) is not None:
+                arguments[field] = self.geometry_array(arguments[field])
+
+        for field in COLOR_FIELDS:
+            if arguments.get(field) is not None:
+                arguments[field] = resolve_color(arguments[field])
+
+        if arguments.get("colors") is not None:
+            colors = arguments["colors"]
+            colors = colors.tolist() if isinstance(colors, np.ndarray) else colors
+
+            # a single color (name or RGB/RGBA tuple) or one per item, as in Drawer.color_table
+            if isinstance(colors, str) or all(isinstance(c, (int, float)) for c in colors):
+                arguments["colors"] = resolve_color(colors)
+            else:
+                arguments["colors"] = [resolve_color(c) for c in colors]
+
+        if "font_size" in signature.parameters and arguments.get("font_size") is None and not self.shared_styles:
+            arguments["font_size"] = self.styles[style_key]["text font size"]
+
+        # N x 4 quiver arrows are coordinates, H x W x 2 flow fields are kept as given
+        if method == "quiver" and np.ndim(arguments["vectors"]) == 2:
+            arguments["vectors"] = np.asarray(arguments["vectors"], dtype=np.float32)
+
+        # COCO RLE and packed masks are kept in their sparse form, as given
+
+        if arguments.get("mask_show") is not None and not self.encoded_mask(arguments["mask_show"]):
+            mask = arguments["mask_show"]
+            arguments["mask_show"] = np.asarray(mask.convert("L") if isinstance(mask, Image.Image) else mask, dtype=np.uint8)
+
+        self.operations.append((method, style_key, arguments))
+
+    def geometry_array(self, value):
+
+        # ragged geometry (e.g. polylines of different lengths) is kept as one array per part
+
+        if not isinstance(value, np.ndarray) and len(value) and len({np.size(part) for part in value}) > 1:
+            return [np.asarray(part, dtype=np.float32) for part in value]
+
+        return np.asarray(value, dtype=np.float32)
+
+    def encoded_mask(self, mask):
+
+        return isinstance(mask, PackedMask) or (isinstance(mask, dict) and "counts" in mask)
+
+    # ---- replaying
+
+    def scale_mask(self, mask, size):
+
+        # dense masks are resized to the replayed image, encoded ones are only expanded
+        # to a full frame when the sizes differ
+
+        if self.encoded_mask(mask):
+
+            height, width = mask.shape if isinstance(mask, PackedMask) else mask["size"]
+
+            if (width, height) == size:
+                return mask
+
+            frame = np.zeros((height, width), dtype=np.uint8)
+            decoded = decode_mask(mask)
+
+            if decoded is not None:
+                crop, (x0, y0) = decoded
+                frame[y0:y0 + crop.shape[0], x0:x0 + crop.shape[1]] = crop
+
+            mask = frame
+
+        mask = Image.fromarray(mask)
+
+        return mask if mask.size == size else mask.resize(size, Image.NEAREST)
+
+    def scale_masks(self, masks, size):
+
+        # a list of masks (any encoding) is scaled mask by mask, an N x H x W stack as a whole
+
+        if isinstance(masks, (list, tuple)):
+            return [self.scale_mask(mask, size) for mask in masks]
+
+        masks = np.asarray(masks)
+
+        if masks.shape[1:][::-1] == size or len(masks) == 0:
+            return masks
+
+        if masks.dtype == bool:
+            masks = masks.astype(np.uint8) * 255
+
+        return np.stack([np.asarray(self.scale_mask(mask, size)) for mask in masks])
+
+    def scale_label_map(self, label_map, size):
+
+        # instance ids must survive the resize: nearest neighbour on 32 bit integers
+
+        label_map = np.asarray(label_map)
+
+        if label_map.shape[::-1] == size:
+            return label_map
+
+        return np.asarray(Image.fromarray(label_map.astype(np.int32)).resize(size, Image.NEAREST))
+
+    def scale_font(self, size, factor):
+
+        return max(int(round(size * factor)), MIN_FONT_SIZE) if size is not None else None
+
+    def scale_style(self, style, factor):
+
+        style = dict(style)
+
+        for field in SIZE_FIELDS:
+            if style.get(field) is not None:
+                style[field] = max(int(round(style[field] * factor)), 1)
+
+        style["text font size"] = self.scale_font(style.get("text font size"), factor)
+
+        return style
+
+    def get_replay_drawer(self, factor = 1.0, drawer = None):
+
+        # one drawer per style scale, the styles are compiled once for each; lists with
+        # shared styles replay on the given (or bound) Drawer itself when unscaled
+
+        if self.shared_styles:
+
+            source = drawer if drawer is not None else self.drawer
+
+            if source is None:
+                raise RuntimeError("display list with shared styles needs a Drawer to replay on")
+
+            if factor == 1.0:
+                return source
+
+            styles = {name: params.as_dict() for name, params in source.drawing_styles.items()}
+
+        else:
+            source = self.drawer
+            styles = self.styles
+
+        if factor not in self.replay_drawers:
+
+            logger = source.logger if source is not None else Logger()
+            drawer = Drawer(logger = logger)
+
+            for key, style in styles.items():
+                drawer.add_style(key, style if factor == 1.0 else self.scale_style(style, factor))
+
+            self.replay_drawers[factor] = drawer
+
+        return self.replay_drawers[factor]
+
+    def scale_geometry(self, value, scale):
+
+        # x, y, confidence triplets (skeletons) keep their confidence
+        if value.ndim > 1 and value.shape[-1] == 3:
+            scaled = value.copy()
+            scaled[..., :2] *= scale
+            return scaled
+
+        return (value.reshape(-1, 2) * scale).reshape(value.shape)
+
+    def replay_geometry(self, value, scale):
+
+        return (value if scale is None else self.scale_geometry(value, scale)).tolist()
+
+    def replay(self, image, scale = None, scale_style = False, drawer = None):
+
+        # scale_style: line widths, point and font sizes follow the geometry scale too
+        # (rounded to 2 decimals so that similar scales share a drawer), e.g. for thumbnails
+
+        factor = round(float(np.min(scale)), 2) if scale_style and scale is not None else 1.0
+
+        drawer = self.get_replay_drawer(factor, drawer)
+
+        # the whole list is replayed on a PIL image, arrays are converted once on each side
+
+        return_numpy = isinstance(image, np.ndarray)
+
+        if return_numpy:
+            image = Image.fromarray(image)
+
+        if scale is not None:
+            scale = np.broadcast_to(np.asarray(scale, dtype=np.float32), (2,))
+
+        for method, style_key, arguments in self.operations:
+
+            kwargs = dict(arguments)
+
+            for field in GEOMETRY_FIELDS:
+                if isinstance(kwargs.get(field), list):
+                    kwargs[field] = [self.replay_geometry(part, scale) for part in kwargs[field]]
+                elif kwargs.get(field) is not None:
+                    kwargs[field] = self.replay_geometry(kwargs[field], scale)
+
+            if factor != 1.0 and kwargs.get("font_size") is not None:
+                kwargs["font_size"] = self.scale_font(kwargs["font_size"], factor)
+
+            if kwargs.get("mask_show") is not None:
+                kwargs["mask_show"] = self.scale_mask(kwargs["mask_show"], image.size)
+
+            if kwargs.get("masks") is not None:
+                kwargs["masks"] = self.scale_masks(kwargs["masks"], image.size)
+
+            if kwargs.get("label_map") is not None:
+                kwargs["label_map"] = self.scale_label_map(kwargs["label_map"], image.size)
+
+            if method == "quiver" and scale is not None and np.ndim(kwargs["vectors"]) == 2:
+                kwargs["vectors"] = self.scale_geometry(kwargs["vectors"], scale)
+
+            image = getattr(drawer, method)(image, apply_style = style_key, **kwargs)
+
+        return np.asarray(image) if return_numpy else image
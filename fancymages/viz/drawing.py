@@ -1,15 +1,26 @@
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 
-from lib.utils.color_names import colors
+from fancymages.utils.color_names import colors
 from contextlib import contextmanager
+from functools import wraps
+from collections import OrderedDict
 from enum import Enum
 import numpy as np
-import matplotlib.pyplot as plt
 import math
 import string 
-
-from lib.viz.parameters import DrawingParams
+import threading
+import time
+
+from fancymages.viz.parameters import DrawingParams, dump_style_pack, load_style_pack
+from fancymages.viz.fonts import font_registry
+from fancymages.viz.snapshots import SnapshotStore
+from fancymages.viz.encoding import Encoder
+from fancymages.viz.topology import SkeletonTopology
+from fancymages.utils.processing import resolve_color
+from fancymages.utils.masks import decode_mask
+from fancymages.utils.colormaps import get_colormap
+from fancymages.utils.raster import clip_segments, segment_pixels, polygon_edges, polygon_spans
 
 # ----------------------------------------
 
@@ -25,32 +36,97 @@ class Positions(int, Enum):
     BOTTOM = 8
     BOTTOMRIGHT = 9
     
+# Pillow mode of a uint8 caller buffer by channel count
+
+BUFFER_MODES = {1: "L", 3: "RGB", 4: "RGBA"}
+
+# hard-edged lines are rasterized in bulk from these many segments on (one color, one
+# color per segment): below, ImageDraw drawing them one by one is faster than the
+# fixed cost of the buffers the size of the covered region
+
+DENSE_MIN_SEGMENTS = 2048
+DENSE_MIN_COLORED_SEGMENTS = 8192
+
 # ----------------------------------------
 
 def convert_to_PIL(func):
 
+    @wraps(func)
     def wrapper(obj, *args, **kwargs):
 
-        if isinstance(args[0], np.ndarray):
-            newimg = Image.fromarray(args[0])
-            result = func(obj, newimg, *args[1:], **kwargs)
-        else:
-            result = func(obj, *args, **kwargs)
+        # nested primitive calls (e.g. skeleton -> segments) already work on a PIL image,
+        # with coordinates transformed by the outermost call
+
+        state = obj.state
+
+        if state.depth > 0:
+
+            state.depth += 1
+
+            try:
+                return func(obj, *args, **kwargs)
+            finally:
+                state.depth -= 1
+
+        state.depth += 1
+        start = time.perf_counter()
+
+        try:
+
+            shared = False
+
+            if isinstance(args[0], np.ndarray):
+
+                if obj.inplace:
+                    newimg, shared = obj.wrap_buffer(args[0])
+                else:
+                    newimg = Image.fromarray(args[0])
+            else:
+                newimg = args[0]
+
+            # styles are compiled to RGBA colors, grayscale and palette images are drawn
+            # in color once here and brought back to their mode below
+
+            canvas = obj.to_color(newimg)
+            result = func(obj, canvas, *args[1:], **kwargs)
+
+            if canvas is not newimg:
+                result = obj.restore_mode(newimg, result, obj.inplace and isinstance(args[0], np.ndarray))
+
+        finally:
+            state.depth -= 1
+            state.draw_time += time.perf_counter() - start
+
+        state.last_image = result
+
+        if obj.inplace and isinstance(args[0], np.ndarray):
 
-        if obj.last_image is not None:
-            del obj.last_image
+            # primitives growing the image (side panels) cannot draw into the caller's
+            # buffer, a new array with the buffer's channels is returned instead
 
-        obj.last_image = result
+            if result.size != newimg.size:
+                return np.array(obj.match_buffer(args[0], result)) if obj.return_numpy else result
+
+            # when the result lives in the caller's memory there is nothing to copy out
+
+            if not shared or result is not newimg:
+                obj.write_back(args[0], result)
+
+            return args[0] if obj.return_numpy else result
 
         if obj.return_numpy:
             return np.array(result)
         else:
             return result
 
+    # marks the drawing primitives, see PRIMITIVES below Drawer
+    wrapper.primitive = True
+
     return wrapper
 
 def not_implemented(func):
 
+    @wraps(func)
     def wrapper(obj, *args, **kwargs):
 
         print()
@@ -59,6 +135,33 @@ def not_implemented(func):
 
     return wrapper
 
+class RenderContext:
+
+    # immutable (style name, compiled style) pair; contexts are stacked per thread,
+    # so nested apply_style calls override the outer style and restore it on exit
+
+    __slots__ = ("style_name", "style")
+
+    def __init__(self, style_name, style):
+
+        object.__setattr__(self, "style_name", style_name)
+        object.__setattr__(self, "style", style)
+
+    def __setattr__(self, name, value):
+
+        raise AttributeError("render contexts are read-only")
+
+class RenderState(threading.local):
+
+    # everything a call mutates lives here, one copy per thread
+
+    def __init__(self):
+
+        self.contexts = list()
+        self.depth = 0
+        self.last_image = None
+        self.draw_time = 0.0
+
 # ------------------
 
 class Drawer:
@@ -67,79 +170,268 @@ class Drawer:
     def __init__(self, logger):
 
         self.cached_image = None
-        self.last_image  = None
+        self.state = RenderState()
 
         self.drawing_styles = dict()
         self.cur_style = None
-        self.previous_style = None
         self._normalized = False
+        self.transform = None
 
         self.return_numpy = False
         self.logger = logger
 
-        self.snapshots = list()
+        self.inplace = False
+        self.channel_order = "RGB"
+
+        self.compiled_styles = dict()
+        self.active_style = None
 
+        self.snapshots = SnapshotStore()
+        self.panel_cache = OrderedDict()
+        self.sprite_cache = OrderedDict()
+
+        if font_registry.logger is None:
+            font_registry.logger = logger
 
     @property
     def style(self):
 
-        return self.drawing_styles[self.cur_style]
+        contexts = self.state.contexts
+
+        return contexts[-1].style if contexts else self.active_style
+
+    @property
+    def last_image(self):
+
+        return self.state.last_image
+
+    def context(self, style_name = None):
+
+        if style_name is None:
+            contexts = self.state.contexts
+            return contexts[-1] if contexts else RenderContext(self.cur_style, self.active_style)
+
+        return RenderContext(style_name, self.compiled_styles[style_name])
             
     def add_style(self, style_name, kwargs):
 
         params = DrawingParams(self.logger, kwargs)
 
+        compiled = params.compile(self.channel_order)
+
         self.drawing_styles[style_name] = params
+        self.compiled_styles[style_name] = compiled
+
+        if style_name == self.cur_style:
+            self.active_style = compiled
 
     def update_style(self, style_name, kwargs):
 
         self.drawing_styles[style_name].update(kwargs)
+        self.compile_style(style_name)
 
     def update_current_style(self, kwargs):
 
-        self.drawing_styles[self.cur_style].update(kwargs)
+        self.update_style(self.cur_style, kwargs)
+
+    def load_styles(self, filename):
+
+        # a whole style pack in one read, e.g. once at worker startup
+
+        for style_name, params in load_style_pack(filename, self.logger).items():
+            self.drawing_styles[style_name] = params
+            self.compile_style(style_name)
+
+        return list(self.drawing_styles.keys())
+
+    def dump_styles(self, filename, style_names = None):
+
+        names = style_names if style_names is not None else self.drawing_styles.keys()
+
+        dump_style_pack(filename, {name: self.drawing_styles[name] for name in names})
+
+    def compile_style(self, style_name):
+
+        # colors, fonts and numbers are resolved here once, not by every primitive
+
+        self.compiled_styles[style_name] = self.drawing_styles[style_name].compile(self.channel_order)
+
+        if style_name == self.cur_style:
+            self.active_style = self.compiled_styles[style_name]
+
+    def activate(self, style_name):
+
+        self.cur_style = style_name
+        self.active_style = self.compiled_styles.get(style_name)
+
+    # ---- caller-owned buffers
+
+    def set_buffer_mode(self, inplace = True, channel_order = "RGB"):
+
+        if channel_order not in ("RGB", "BGR"):
+            raise ValueError("channel order must be RGB or BGR")
+
+        self.inplace = inplace
+        self.channel_order = channel_order
+
+        for style_name in self.drawing_styles:
+            self.compile_style(style_name)
+
+    def ink(self, color):
+
+        # in BGR mode the pixels are never reordered, the drawing colors are swapped instead
+
+        if color is None or self.channel_order == "RGB":
+            return color
+
+        red, green, blue, alpha = resolve_color(color)
+
+        return (blue, green, red, alpha)
+
+    def wrap_buffer(self, array):
+
+        # HxWx4 uint8 C-contiguous buffers are shared with Pillow, anything else is copied once
+
+        if array.dtype == np.uint8 and array.ndim == 3 and array.shape[2] == 4 and array.flags.c_contiguous and array.flags.writeable:
+
+            image = Image.frombuffer("RGBA", (array.shape[1], array.shape[0]), array, "raw", "RGBA", 0, 1)
+            image.readonly = 0
+
+            return image, True
+
+        # HxWx3 frames (e.g. OpenCV BGR) are drawn on an RGB copy, the primitives that need
+        # alpha convert it themselves; for chains of primitives use canvas()
+
+        return Image.fromarray(array), False
+
+    def match_buffer(self, array, image):
+
+        # the image in the Pillow mode of a uint8 buffer's channels, None for other buffers
+
+        mode = BUFFER_MODES.get(array.shape[2] if array.ndim == 3 else 1) if array.dtype == np.uint8 else None
+
+        if mode is None:
+            return None
+
+        return image if image.mode == mode else image.convert(mode)
+
+    def write_back(self, array, image):
+
+        if image.size != (array.shape[1], array.shape[0]):
+            raise ValueError(f"a {image.size[0]}x{image.size[1]} result cannot be written back to a {array.shape[1]}x{array.shape[0]} buffer")
+
+        converted = self.match_buffer(array, image)
+
+        if converted is None:
+            np.copyto(array, np.asarray(image))
+            return
+
+        image = converted
+
+        # one pass out of Pillow, one into the caller's buffer
+        np.copyto(array, np.frombuffer(image.tobytes(), dtype=np.uint8).reshape(array.shape))
+
+    @contextmanager
+    def canvas(self, frame):
+
+        # one PIL image for a whole chain of primitives, written back to the frame at the end
+
+        image, shared = self.wrap_buffer(frame)
+
+        # RGBA from the start, so that the primitives converting to RGBA draw on this image
+        if not shared and image.mode == "RGB":
+            image = self.to_rgba(image)
+
+        try:
+            yield image
+        finally:
+            if not shared:
+                self.write_back(frame, image)
 
 
     def set_style(self, style_name):
 
         if style_name in self.drawing_styles.keys():
-            self.cur_style = style_name
+            self.activate(style_name)
         else:
             print("style not found")
 
     @contextmanager
     def temp_style(self, style_name):
 
-        applied = False
-
-        try:
+        # the style travels with the calling thread only; set_style stays the shared default
 
-            if self.previous_style is None:
+        if style_name is None:
+            yield self.context()
+            return
 
-                self.previous_style = self.cur_style
-                
-                if style_name is not None:
-                    self.cur_style = style_name
-                    
-                applied = True
+        context = style_name if isinstance(style_name, RenderContext) else self.context(style_name)
 
-            yield None
+        contexts = self.state.contexts
+        contexts.append(context)
 
+        try:
+            yield context
         finally:
-
-            if applied:
-
-                self.cur_style = self.previous_style
-                self.previous_style = None
+            contexts.pop()
 
     def set_normalized_coords(self, value):
 
         self._normalized = value
 
-    @not_implemented
+    def set_transform(self, transform):
+
+        # a CoordinateTransform applied to every coordinate passed to the primitives
+        # (after normalized -> pixel conversion), e.g. to undo a letterbox
+
+        self.transform = transform
+
     def denormalize_points(self, points, shape):
 
-        pass
+        # shape is the numpy shape of the image, (height, width[, channels])
+
+        # works on any array of interleaved x, y pairs (Nx2, Nx4 boxes, PxJx2, ...)
+
+        points = np.asarray(points, dtype=np.float64)
+
+        return (points.reshape(-1, 2) * np.array([shape[1], shape[0]], dtype=np.float64)).reshape(points.shape)
+
+    def prepare_points(self, points, image, normalized = False):
+
+        # one vectorized transform for all the coordinates of a call; nested calls
+        # receive coordinates that were already converted by the outer primitive
+
+        points = np.asarray(points, dtype=np.float64)
+
+        if self.state.depth > 1:
+            return points
+
+        if normalized or self._normalized:
+            points = self.denormalize_points(points, image.size[::-1])
+
+        return self.transform_points(points)
+
+    def transform_points(self, points):
+
+        # the coordinate transform alone, for coordinates built in pixels (e.g. flow fields)
+
+        points = np.asarray(points, dtype=np.float64)
+
+        if self.state.depth > 1 or self.transform is None:
+            return points
+
+        return self.transform.apply(points)
+
+    def get_font(self, font_size = None):
+
+        if font_size is None:
+            return self.style.font
+
+        return font_registry.get_font(self.style._text_font, font_size)
+
+    def font_stats(self):
+
+        return font_registry.stats()
 
     def get_circle(self, x, y, radius):
 
@@ -164,18 +456,154 @@ class Drawer:
 
         return labels
 
+    def cached_sprite(self, key, build):
+
+        # small rendered pieces (point disks, label texts) reused across calls and frames
+
+        sprite = self.sprite_cache.get(key)
+
+        if sprite is None:
+
+            sprite = build()
+            self.sprite_cache[key] = sprite
+
+            while len(self.sprite_cache) > 1024:
+                self.sprite_cache.popitem(last=False)
+
+        return sprite
+
+    def point_sprite(self):
+
+        # (offsets, colors) of every visible pixel of the current style's point disk,
+        # rendered with the same ellipse call as the per-point path
+
+        radius = int(round(self.style._points_size))
+        key = ("point", radius, self.style._points_color, self.style._points_outline_color, self.style._points_outline_thickness)
+
+        def build():
+
+            disk = Image.new("RGBA", (2 * radius + 1, 2 * radius + 1), (0, 0, 0, 0))
+            ImageDraw.Draw(disk).ellipse(self.get_circle(radius, radius, radius), fill=self.style._points_color, outline=self.style._points_outline_color, width=self.style._points_outline_thickness)
+
+            pixels = np.asarray(disk)
+            rows, cols = np.nonzero(pixels[..., 3])
+
+            return np.stack([cols - radius, rows - radius], axis=1), pixels[rows, cols]
+
+        return self.cached_sprite(key, build)
+
+    def text_sprite(self, text, font):
+
+        # the text's coverage mask, filled with the text color when pasted, as canvas.text does
+
+        def build():
+
+            # glyphs may start left of the origin (negative bbox left), the sprite keeps that part
+
+            left, _, right, bottom = font_registry.text_bbox(font, text)
+            left = min(left, 0)
+
+            sprite = Image.new("L", (right - left, bottom), 0)
+            ImageDraw.Draw(sprite).text((-left, 0), text, font=font, fill=255)
+
+            return sprite, left
+
+        return self.cached_sprite(("text", text, font), build)
+
+    def point_centers(self, points):
+
+        # point disks and their labels sit on the nearest pixel, in every drawing path
+
+        return np.round(points)
+
+    def stamp_points(self, image, points):
+
+        offsets, colors = self.point_sprite()
+        radius = int(np.abs(offsets).max()) if len(offsets) else 0
+
+        width, height = image.size
+        centers = self.point_centers(points).astype(np.int64)
+
+        # points whose disk misses the image entirely are dropped; the rest are stamped
+        # into a crop padded by the radius, so no sprite pixel needs its own bounds check
+
+        visible = (centers[:, 0] > -radius - 1) & (centers[:, 0] < width + radius) & (centers[:, 1] > -radius - 1) & (centers[:, 1] < height + radius)
+        centers = centers[visible]
+
+        if len(centers) == 0 or len(offsets) == 0:
+            return image
+
+        x0, y0 = centers.min(axis=0) - radius
+        x1, y1 = centers.max(axis=0) + radius + 1
+
+        frame = np.array(image.crop((int(x0), int(y0), int(x1), int(y1))))
+        channels = frame.shape[2]
+
+        stride = int(x1 - x0)
+        starts = (centers[:, 1] - y0) * stride + (centers[:, 0] - x0)
+        pixels = starts[:, None] + (offsets[:, 1] * stride + offsets[:, 0])[None, :]
+
+        # one scatter of the sprite colors for all the points, later points landing on top
+        # as with the per-point path; like ImageDraw, colors are written, not blended
+        frame.reshape(-1, channels)[pixels] = colors[:, :channels]
+
+        # only the part of the padded crop that lies inside the image goes back
+        left, top = max(int(x0), 0), max(int(y0), 0)
+        right, bottom = min(int(x1), width), min(int(y1), height)
+
+        inner = frame[top - int(y0):bottom - int(y0), left - int(x0):right - int(x0)]
+        image.paste(Image.fromarray(np.ascontiguousarray(inner)), (left, top))
+
+        return image
+
+    def stamp_labels(self, image, points, labels, font):
+
+        # the same font canvas.text falls back to when the style has no font size
+        font = font if font is not None else ImageDraw.Draw(image).getfont()
+
+        offset = np.array([10, -2 * self.style._points_size - 10])
+
+        color = self.style._text_color if self.style._text_color is not None else (255, 255, 255, 255)
+
+        for point, label in zip((self.point_centers(points) + offset).tolist(), labels):
+
+            sprite, left = self.text_sprite(label, font)
+            x_coord, y_coord = int(point[0]) + left, int(point[1])
+
+            image.paste(color[:len(image.getbands())], (x_coord, y_coord, x_coord + sprite.size[0], y_coord + sprite.size[1]), sprite)
+
+        return image
+
     @convert_to_PIL
-    def keypoints(self, image, points = None, labels = None, font_size = None, normalized = False, apply_style = None):
+    def keypoints(self, image, points = None, labels = None, font_size = None, dense = False, normalized = False, apply_style = None):
+
+        # dense: stamps a cached disk sprite at every point with one vectorized blend,
+        # for clouds of thousands of small points (tracks, feature points); labels are pasted
+        # from cached text masks once all the points are drawn
 
         if labels is not None:
             labels = self.process_labels(labels, points)
 
+        points = self.prepare_points(points, image, normalized).reshape(-1, 2)
+
         canvas = ImageDraw.Draw(image)
-        font = ImageFont.truetype("arial", font_size if font_size is not None else self.style._text_font_size)
 
         with self.temp_style(apply_style):
 
-            for idx, point in enumerate(points):
+            font = self.get_font(font_size)
+
+            if dense:
+
+                image = self.stamp_points(image, points)
+
+                if labels is not None:
+                    image = self.stamp_labels(image, points[:len(labels)], labels, font)
+
+                return image
+
+            centers = self.point_centers(points).tolist()
+
+            for idx, point in enumerate(centers):
 
                 circle = self.get_circle(point[0], point[1], self.style._points_size)
                 canvas.ellipse(circle, fill=self.style._points_color, outline=self.style._points_outline_color, width=self.style._points_outline_thickness)
@@ -192,6 +620,82 @@ class Drawer:
         return image
 
 
+    def to_rgba(self, image):
+
+        return image if image.mode == "RGBA" else image.convert("RGBA")
+
+    def to_color(self, image):
+
+        # the compiled style colors are RGBA, so every primitive draws on RGB(A) images
+
+        if image.mode in ("RGB", "RGBA"):
+            return image
+
+        return image.convert("RGBA" if image.mode in ("LA", "PA") else "RGB")
+
+    def restore_mode(self, image, result, buffer):
+
+        # grayscale results go back to the caller's mode, drawn into the given image when
+        # the size is unchanged (as primitives draw in place); caller buffers are converted
+        # by write_back, other modes (palette, integer) are returned in color
+
+        if buffer or image.mode not in ("L", "LA"):
+            return result
+
+        result = result.convert(image.mode)
+
+        if result.size != image.size:
+            return result
+
+        image.paste(result)
+
+        return image
+
+    def overlay_region(self, image_size, rects):
+
+        rects = np.asarray(rects, dtype=float).reshape(-1, 4)
+
+        x0 = max(int(math.floor(rects[:, 0].min())), 0)
+        y0 = max(int(math.floor(rects[:, 1].min())), 0)
+        x1 = min(int(math.ceil(rects[:, 2].max())) + 1, image_size[0])
+        y1 = min(int(math.ceil(rects[:, 3].max())) + 1, image_size[1])
+
+        if x1 <= x0 or y1 <= y0:
+            return None
+
+        return x0, y0, x1, y1
+
+    def draw_labels(self, image, labels):
+
+        # labels are (backdrop, origin, text, fill color, text color, font) tuples;
+        # only the region they cover is allocated and composited back in place
+
+        rects = list()
+
+        for backdrop, origin, text, _, _, font in labels:
+            left, top, right, bottom = font_registry.text_bbox(font, text)
+            rects.append(backdrop)
+            rects.append([origin[0] + left, origin[1] + top, origin[0] + right, origin[1] + bottom])
+
+        region = self.overlay_region(image.size, rects) if rects else None
+
+        if region is None:
+            return image
+
+        x0, y0, x1, y1 = region
+
+        txt_image = Image.new('RGBA', (x1 - x0, y1 - y0), (0,0,0,0))
+        prompt_draw = ImageDraw.Draw(txt_image)
+
+        for backdrop, origin, text, fill_color, text_color, font in labels:
+
+            prompt_draw.rectangle([backdrop[0] - x0, backdrop[1] - y0, backdrop[2] - x0, backdrop[3] - y0], fill=fill_color)
+            prompt_draw.text((origin[0] - x0, origin[1] - y0), text, fill=text_color, font=font)
+
+        image.alpha_composite(txt_image, dest=(x0, y0))
+
+        return image
+
     def get_anchor_coordinates(self, image_size, text_size, box_coords, position, inner, box_thickness, margin):
 
         half_margin = margin/2.0
@@ -260,7 +764,11 @@ class Drawer:
     @convert_to_PIL
     def box(self, image, point_tl, point_br, font_size = None, margin = 5, color = None, text_color = None, position = "top left", label = None, inner = False, normalized = False, apply_style = None):
 
-        image = image.convert("RGBA")
+        image = self.to_rgba(image)
+
+        color, text_color = self.ink(color), self.ink(text_color)
+
+        coords = self.prepare_points(np.concatenate([np.ravel(point_tl), np.ravel(point_br)]), image, normalized).tolist()
 
         canvas = ImageDraw.Draw(image)
 
@@ -268,71 +776,306 @@ class Drawer:
 
             box_color = color if color is not None else self.style._line_color
 
-            canvas.rectangle(list(point_tl + point_br), fill=self.style._box_fill_color, outline=box_color, width=self.style._line_thickness)
+            canvas.rectangle(coords, fill=self.style._box_fill_color, outline=box_color, width=self.style._line_thickness)
 
             if label is not None:
 
-                font = ImageFont.truetype("arial", font_size if font_size is not None else self.style._text_font_size)
-
-                txt_image = Image.new('RGBA', image.size, (0,0,0,0))
-
-                prompt_draw = ImageDraw.Draw(txt_image)
+                font = self.get_font(font_size)
 
-                text_size = font.getsize(label)
+                text_size = font_registry.text_size(font, label)
                 prompt_size = (text_size[0], text_size[1])
-                coords, box_coords = self.get_anchor_coordinates(image.size, prompt_size, list(point_tl + point_br), position, inner, self.style._line_thickness, margin)
+                coords, box_coords = self.get_anchor_coordinates(image.size, prompt_size, coords, position, inner, self.style._line_thickness, margin)
 
                 text_fill_color = color if color is not None else self.style._text_fill_color
-                prompt_draw.rectangle(box_coords, fill=text_fill_color)
-
                 text_real_color = text_color if text_color is not None else self.style._text_color
-                prompt_draw.text(coords, label, fill=text_real_color, font=font)
 
-                image = Image.alpha_composite(image, txt_image)    
+                image = self.draw_labels(image, [(box_coords, coords, label, text_fill_color, text_real_color, font)])
 
         return image
 
-    @convert_to_PIL
-    def segments(self, image, segments, thickness = None, normalized = False, apply_style = None):
+    def per_item(self, values, count, default):
 
-        with self.temp_style(apply_style):
+        if values is None:
+            return [default] * count
 
-            canvas = ImageDraw.Draw(image)
+        if isinstance(values, np.ndarray):
+            values = [tuple(v) for v in values.tolist()] if values.ndim == 2 else values.tolist()
 
-            for segment in segments:
+        if isinstance(values, str) or all(isinstance(v, (int, float)) for v in values):
+            return [values] * count
 
-                real_thickness = thickness if thickness  is not None else self.style._line_thickness
-                canvas.line(segment, fill=self.style._line_color, width=real_thickness)
+        return list(values)
 
-            return image
+    def box_labels(self, labels, scores, count, score_format):
 
-    def get_coordinates(self, image_size, text_size, alignment, margin):
+        if labels is None and scores is None:
+            return [None] * count
 
-        half_margin = margin/2.0
+        # unlike colors, a sequence of numbers is one label per box (class ids)
 
-        if "left" in alignment:
-            x_coord = half_margin
-            box_xmin = 0
-            box_xmax = text_size[0]+margin
-        elif "center" in alignment:
-            x_coord = image_size[0]/2.0 - text_size[0]/2.0
-            box_xmin = x_coord - half_margin
-            box_xmax = box_xmin + text_size[0] + margin
-        elif "right" in alignment:
-            x_coord = image_size[0] - text_size[0] - half_margin
-            box_xmin = image_size[0] - text_size[0] - margin
-            box_xmax = image_size[0]
+        if labels is None:
+            labels = [""] * count
+        elif isinstance(labels, (str, int, float, np.generic)):
+            labels = [str(labels)] * count
         else:
-            raise ValueError("wrong x alignment")
+            labels = [str(label) for label in np.asarray(labels).tolist()]
 
-        if "top" in alignment:
-            y_coord = half_margin
-            box_ymin = 0
-            box_ymax = text_size[1]+margin
-        elif "middle" in alignment:
-            y_coord = image_size[1]/2.0 - text_size[1]/2.0
-            box_ymin = y_coord - half_margin
-            box_ymax = box_ymin + text_size[1] + margin
+        if len(labels) != count:
+            raise ValueError(f"{len(labels)} labels given for {count} boxes")
+
+        if scores is None:
+            return labels
+
+        return [score_format.format(label=label, score=score).strip() for label, score in zip(labels, np.asarray(scores).tolist())]
+
+    @convert_to_PIL
+    def boxes(self, image, boxes, labels = None, colors = None, scores = None, font_size = None, margin = 5, text_color = None, position = "top left", inner = False, score_format = "{label} {score:.2f}", normalized = False, apply_style = None):
+
+        image = self.to_rgba(image)
+
+        boxes = self.prepare_points(np.asarray(boxes, dtype=float).reshape(-1, 4), image, normalized)
+
+        canvas = ImageDraw.Draw(image)
+
+        with self.temp_style(apply_style):
+
+            thickness = self.style._line_thickness
+            fill_color = self.style._box_fill_color
+
+            box_colors = [self.ink(c) for c in self.per_item(colors, len(boxes), None)] if colors is not None else [self.style._line_color] * len(boxes)
+            text_fill_colors = box_colors if colors is not None else [self.style._text_fill_color] * len(boxes)
+            texts = self.box_labels(labels, scores, len(boxes), score_format)
+
+            coords_list = boxes.tolist()
+
+            for coords, box_color in zip(coords_list, box_colors):
+                canvas.rectangle(coords, fill=fill_color, outline=box_color, width=thickness)
+
+            if any(text is not None for text in texts):
+
+                font = self.get_font(font_size)
+                text_real_color = self.ink(text_color) if text_color is not None else self.style._text_color
+
+                # every label backdrop and text goes into the same overlay, composited once
+
+                prompts = list()
+
+                for coords, text, text_fill_color in zip(coords_list, texts, text_fill_colors):
+
+                    if text is None:
+                        continue
+
+                    text_size = font_registry.text_size(font, text)
+                    text_coords, box_coords = self.get_anchor_coordinates(image.size, text_size, coords, position, inner, thickness, margin)
+
+                    prompts.append((box_coords, text_coords, text, text_fill_color, text_real_color, font))
+
+                image = self.draw_labels(image, prompts)
+
+        return image
+
+    def color_table(self, colors, count, default):
+
+        # count x 4 uint8 RGBA rows in drawing order (a single row for a single color),
+        # from a color, a list or an N x 3/4 array
+
+        if isinstance(colors, np.ndarray) and colors.ndim == 2:
+
+            table = np.full((count, 4), 255, dtype=np.uint8)
+            table[:, :colors.shape[1]] = colors[:count]
+
+            return table[:, [2, 1, 0, 3]] if self.channel_order == "BGR" else table
+
+        # the default comes from a compiled style, its channels are already in drawing order
+
+        if colors is None:
+            rows = [resolve_color(default)]
+        elif isinstance(colors, str) or all(isinstance(c, (int, float)) for c in colors):
+            rows = [resolve_color(self.ink(colors))]
+        else:
+            rows = [resolve_color(self.ink(c)) for c in self.per_item(colors, count, default)]
+
+        return np.array([row if row is not None else (0, 0, 0, 0) for row in rows], dtype=np.uint8).reshape(-1, 4)
+
+    def polyline_segments(self, segments):
+
+        # N x 2k polylines as (N * (k - 1)) x 4 segments, plus the polyline of each segment
+
+        points = segments.reshape(len(segments), -1, 2)
+        pairs = np.concatenate([points[:, :-1], points[:, 1:]], axis=2).reshape(-1, 4)
+
+        return pairs, np.repeat(np.arange(len(segments)), points.shape[1] - 1)
+
+    def rasterize_segments(self, image, segments, colors, thickness, antialias):
+
+        pairs, owner = self.polyline_segments(segments)
+
+        if not antialias:
+            # hard-edged lines start and end on whole pixels, truncated as ImageDraw.line does
+            pairs = np.trunc(pairs)
+
+        pad = int(np.ceil(thickness)) + 2
+
+        pairs, kept = clip_segments(pairs, image.size[0], image.size[1], margin = pad - 2)
+
+        if len(pairs) == 0:
+            return image
+
+        colors = colors[owner[kept]] if len(colors) > 1 else colors
+
+        # the segments are rasterized over the region they cover, padded beyond the image
+        # borders so that no pixel needs its own bounds check
+
+        left, top = np.floor(pairs.reshape(-1, 2).min(axis=0)).astype(int) - pad
+        right, bottom = np.ceil(pairs.reshape(-1, 2).max(axis=0)).astype(int) + pad + 1
+
+        width, height = int(right - left), int(bottom - top)
+        uniform = len(colors) == 1
+
+        # each pixel records the topmost (last) segment drawn over it, colors are looked up
+        # once per touched pixel at the end; a single color only needs the drawn pixels
+
+        owners = np.zeros(width * height, dtype=bool) if uniform else np.full(width * height, -1, dtype=np.int32)
+
+        if antialias:
+            coverage = np.zeros(width * height, dtype=np.float32)
+
+        for flat, weight, index in segment_pixels(pairs - [left, top, left, top], width, thickness, antialias, indexed = not uniform):
+
+            if uniform:
+                owners[flat] = True
+            else:
+                np.maximum.at(owners, flat, index.astype(np.int32))
+
+            if antialias:
+                # each pixel keeps its strongest coverage
+                np.maximum.at(coverage, flat, weight)
+
+        return self.paste_owners(image, (int(left), int(top)), (width, height), owners, colors, coverage if antialias else None, blend = antialias)
+
+    def draw_segments(self, image, segments, colors, thickness, antialias):
+
+        # N x 2k segments and their color_table rows: rasterized at once when antialiased
+        # or numerous enough (see DENSE_MIN_SEGMENTS), otherwise one ImageDraw.line each
+
+        if antialias or len(segments) >= (DENSE_MIN_SEGMENTS if len(colors) == 1 else DENSE_MIN_COLORED_SEGMENTS):
+            return self.rasterize_segments(image, segments, colors, thickness, antialias)
+
+        canvas = ImageDraw.Draw(image)
+
+        for segment, color in zip(segments.tolist(), np.broadcast_to(colors, (len(segments), 4)).tolist()):
+            canvas.line(segment, fill=tuple(color), width=thickness)
+
+        return image
+
+    def paste_owners(self, image, origin, size, owners, colors, coverage = None, blend = False):
+
+        # owners: flat buffer of the size given, holding for each pixel the row of colors
+        # drawn there (-1 for none), or whether it is drawn for a single color. The colors
+        # go into one layer written with a single paste: as is (like ImageDraw) or, when
+        # blend, through their alpha times coverage
+
+        width, height = size
+
+        drawn = owners if owners.dtype == bool else owners >= 0
+
+        # opaque colors without coverage blend as they are pasted
+        blend = blend and (coverage is not None or bool((colors[:, 3] < 255).any()))
+
+        if len(colors) == 1:
+            layer = Image.new("RGBA", size, tuple(int(c) for c in colors[0][:3]) + (255 if blend else int(colors[0][3]),))
+        else:
+            # the extra last row is what the -1 owners pick up, never shown
+            table = np.zeros((len(colors) + 1, 4), dtype=np.uint8)
+            table[:-1] = colors
+
+            if blend:
+                table[:, 3] = 255
+
+            layer = Image.fromarray(np.take(table, owners, axis=0).reshape(height, width, 4))
+
+        if blend:
+            # the blend weights are only worked out for the drawn pixels
+            index = np.flatnonzero(drawn)
+            weights = colors[:, 3].astype(np.float32)[owners[index] if owners.dtype != bool else 0]
+            weights = weights * coverage[index] if coverage is not None else weights
+
+            mask = np.zeros(width * height, dtype=np.uint8)
+            mask[index] = np.round(weights).astype(np.uint8)
+
+            mask = Image.fromarray(mask.reshape(height, width))
+        else:
+            # a bilevel mask: Pillow copies the pixels without blending, far faster
+            mask = Image.fromarray(drawn.reshape(height, width))
+
+        # the parts beyond the image borders are clipped by Pillow
+        image.paste(layer, origin, mask)
+
+        return image
+
+    @convert_to_PIL
+    def segments(self, image, segments, thickness = None, colors = None, antialias = False, dense = False, normalized = False, apply_style = None):
+
+        # an N x 4 (or N x 2k polyline) array is transformed in one go; ragged
+        # polylines of different lengths fall back to one array per segment
+
+        # dense (or antialias): every segment is rasterized at once with NumPy, for
+        # trajectories and graphs with tens of thousands of segments; dense hard-edged
+        # lines fall back to the loop below DENSE_MIN_SEGMENTS
+
+        try:
+            segments = self.prepare_points(segments, image, normalized)
+        except ValueError:
+            segments = [self.prepare_points(segment, image, normalized).reshape(-1) for segment in segments]
+            dense = antialias = False
+
+        with self.temp_style(apply_style):
+
+            real_thickness = thickness if thickness  is not None else self.style._line_thickness
+
+            if dense or antialias:
+
+                segments = segments.reshape(len(segments), -1)
+                colors = self.color_table(colors, len(segments), self.style._line_color)
+
+                return self.draw_segments(image, segments, colors, real_thickness, antialias)
+
+            canvas = ImageDraw.Draw(image)
+
+            line_colors = [self.ink(c) for c in self.per_item(colors, len(segments), None)] if colors is not None else [self.style._line_color] * len(segments)
+
+            for segment, line_color in zip(segments, line_colors):
+                canvas.line(np.ravel(segment).tolist(), fill=line_color, width=real_thickness)
+
+            return image
+
+    def get_coordinates(self, image_size, text_size, alignment, margin):
+
+        half_margin = margin/2.0
+
+        if "left" in alignment:
+            x_coord = half_margin
+            box_xmin = 0
+            box_xmax = text_size[0]+margin
+        elif "center" in alignment:
+            x_coord = image_size[0]/2.0 - text_size[0]/2.0
+            box_xmin = x_coord - half_margin
+            box_xmax = box_xmin + text_size[0] + margin
+        elif "right" in alignment:
+            x_coord = image_size[0] - text_size[0] - half_margin
+            box_xmin = image_size[0] - text_size[0] - margin
+            box_xmax = image_size[0]
+        else:
+            raise ValueError("wrong x alignment")
+
+        if "top" in alignment:
+            y_coord = half_margin
+            box_ymin = 0
+            box_ymax = text_size[1]+margin
+        elif "middle" in alignment:
+            y_coord = image_size[1]/2.0 - text_size[1]/2.0
+            box_ymin = y_coord - half_margin
+            box_ymax = box_ymin + text_size[1] + margin
         elif "bottom" in alignment:
             box_ymin = image_size[1] - text_size[1] - margin
             box_ymax = image_size[1]
@@ -348,17 +1091,13 @@ class Drawer:
     @convert_to_PIL
     def text_anchor(self, image, margin = 20, font_size = None, text_show = "empty", position = None, alignment = "bottom center", normalized = False, apply_style = None):
 
-        image = image.convert("RGBA")
+        image = self.to_rgba(image)
 
         with self.temp_style(apply_style):
 
-            font = ImageFont.truetype("arial", font_size if font_size is not None else self.style._text_font_size)
-
-            txt_image = Image.new('RGBA', image.size, (0,0,0,0))
-
-            prompt_draw = ImageDraw.Draw(txt_image)
+            font = self.get_font(font_size)
 
-            left, top, right, bottom = font.getbbox(text_show)
+            left, top, right, bottom = font_registry.text_bbox(font, text_show)
             text_size = right - left, bottom - top
             # text_size = font.getsize(text_show)
             
@@ -366,19 +1105,43 @@ class Drawer:
 
             coords, box_coords = self.get_coordinates(image.size, prompt_size, alignment, margin)
 
-            prompt_draw.rectangle(box_coords, fill=self.style._text_fill_color)
-            prompt_draw.text(coords, text_show, fill=self.style._text_color, font=font)
-
-        
-        image = Image.alpha_composite(image, txt_image)    
+            image = self.draw_labels(image, [(box_coords, coords, text_show, self.style._text_fill_color, self.style._text_color, font)])
 
         return image
 
-    def snapshot(self, image):
-        self.snapshots.append(image.copy())
+    def snapshot(self, image = None):
+
+        # primitives draw in place, so the store always keeps its own copy
+
+        image = image if image is not None else self.last_image
+
+        if image is None:
+            raise RuntimeError("nothing to snapshot, no image given and nothing drawn on this thread yet")
+
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
 
-    def snapshot(self):
-        self.snapshots.append(self.last_image)
+        return self.snapshots.add(image)
+
+    def encode(self, image = None, encoder = None, format = "JPEG", preset = "fast"):
+
+        # encodes the result of the drawing chain run on this thread since the previous encode;
+        # the returned frame reports that chain's draw time next to the encode time
+
+        image = image if image is not None else self.last_image
+        encoder = encoder if encoder is not None else Encoder(format, preset)
+
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+
+        if self.channel_order == "BGR":
+            bands = image.split()
+            image = Image.merge(image.mode, (bands[2], bands[1], bands[0]) + bands[3:])
+
+        draw_time = self.state.draw_time
+        self.state.draw_time = 0.0
+
+        return encoder.encode(image, draw_time = draw_time)
 
     def show_snapshots(self):
         for snap in self.snapshots:
@@ -387,11 +1150,13 @@ class Drawer:
     @convert_to_PIL
     def text(self, image, coords = None, margin = 30, font_size = None, text_show = "empty", position = None, alignment = "bottom center", normalized = False, apply_style = None):
 
-        image = image.convert("RGBA")
+        image = self.to_rgba(image)
+
+        coords = tuple(self.prepare_points(coords, image, normalized).tolist())
 
         with self.temp_style(apply_style):
     
-            font = ImageFont.truetype("arial", font_size if font_size is not None else self.style._text_font_size)
+            font = self.get_font(font_size)
 
             # text_size = font.getsize(text_show)
             # prompt_size = (text_size[0]+margin, text_size[1]+margin)
@@ -404,17 +1169,11 @@ class Drawer:
 
             half_margin = margin // 2
 
-            txt_image = Image.new('RGBA', image.size, (0,0,0,0))
-            prompt_draw = ImageDraw.Draw(txt_image)
-
-            text_size = font.getsize(text_show)
+            text_size = font_registry.text_size(font, text_show)
 
             box_coords = [coords[0] - half_margin, coords[1] - half_margin, coords[0] + text_size[0] + half_margin, coords[1] + text_size[1] + half_margin]
 
-            prompt_draw.rectangle(box_coords, fill=self.style._text_fill_color)
-            prompt_draw.text(coords, text_show, fill=self.style._text_color, font=font)
-
-            image = Image.alpha_composite(image, txt_image)
+            image = self.draw_labels(image, [(box_coords, coords, text_show, self.style._text_fill_color, self.style._text_color, font)])
 
         return image
 
@@ -424,54 +1183,433 @@ class Drawer:
 
         pass
     
+    # ---- side panels
+
+    def panel_size(self, image, side, size):
+
+        if side in ("left", "right"):
+            return (size, image.size[1])
+
+        if side in ("top", "bottom"):
+            return (image.size[0], size)
+
+        raise ValueError("side must be left, right, top or bottom")
+
+    def panel_colors(self):
+
+        background = self.style._text_fill_color if self.style._text_fill_color is not None else (0,0,0,255)
+        foreground = self.style._text_color if self.style._text_color is not None else (255,255,255,255)
+
+        return background, foreground
+
+    def panel_background(self, key, size, mode, draw_static):
+
+        # the static part of a panel (fill, labels, axes) is rendered once per layout and
+        # style; each frame starts from a copy of it and only draws the changing content
+
+        cached = self.panel_cache.get(key)
+
+        if cached is None:
+
+            cached = Image.new(mode, size, self.panel_colors()[0])
+            draw_static(ImageDraw.Draw(cached))
+
+            self.panel_cache[key] = cached
+
+            while len(self.panel_cache) > 32:
+                self.panel_cache.popitem(last=False)
+
+        return cached.copy()
+
+    def attach_panel(self, image, panel, side):
+
+        width, height = image.size
+
+        if side in ("left", "right"):
+            result = Image.new(image.mode, (width + panel.size[0], height))
+        else:
+            result = Image.new(image.mode, (width, height + panel.size[1]))
+
+        image_offset = {"left": (panel.size[0], 0), "top": (0, panel.size[1])}.get(side, (0, 0))
+        panel_offset = {"right": (width, 0), "bottom": (0, height)}.get(side, (0, 0))
+
+        result.paste(image, image_offset)
+        result.paste(panel, panel_offset)
+
+        return result
+
     @convert_to_PIL
-    @not_implemented
-    def side_text(self, image, text, side = "right", apply_style = None):
+    def side_text(self, image, text, side = "right", size = 300, font_size = None, margin = 10, apply_style = None):
 
-        pass
+        with self.temp_style(apply_style):
+
+            panel_size = self.panel_size(image, side, size)
+            panel = self.panel_background(("text", panel_size, image.mode, self.style), panel_size, image.mode, lambda canvas: None)
+
+            font = self.get_font(font_size)
+            foreground = self.panel_colors()[1]
+
+            canvas = ImageDraw.Draw(panel)
+            y_coord = margin
+
+            for line in text.split("\n"):
+                canvas.text((margin, y_coord), line, font=font, fill=foreground)
+                y_coord += font_registry.text_size(font, line or " ")[1] + margin // 2
+
+        return self.attach_panel(image, panel, side)
 
     @convert_to_PIL
-    @not_implemented
-    def side_barplot(self, image, text, side = "right", apply_style = None):
+    def side_barplot(self, image, values, labels = None, side = "right", size = 300, max_value = 1.0, colors = None, show_values = False, font_size = None, margin = 10, apply_style = None):
 
-        pass
+        values = np.asarray(values, dtype=np.float32).reshape(-1)
+        labels = tuple(labels) if labels is not None else tuple(str(i) for i in range(len(values)))
+
+        with self.temp_style(apply_style):
+
+            panel_size = self.panel_size(image, side, size)
+            font = self.get_font(font_size)
+            foreground = self.panel_colors()[1]
+
+            label_width = max(font_registry.text_size(font, label)[0] for label in labels) if labels else 0
+
+            value_width = font_registry.text_size(font, "0.00")[0] + 4 if show_values else 0
+
+            bar_left = margin + label_width + margin
+            bar_span = max(panel_size[0] - bar_left - margin - value_width, 1)
+            row_height = (panel_size[1] - 2 * margin) / max(len(values), 1)
+
+            def draw_labels(canvas):
+                for idx, label in enumerate(labels):
+                    text_height = font_registry.text_size(font, label)[1]
+                    canvas.text((margin, margin + idx * row_height + (row_height - text_height) / 2), label, font=font, fill=foreground)
+
+            key = ("barplot", panel_size, image.mode, self.style, labels, font_size, margin)
+            panel = self.panel_background(key, panel_size, image.mode, draw_labels)
+
+            # all bar geometry at once, then one rectangle call per bar
+
+            lengths = np.clip(values / max_value, 0, 1) * bar_span
+            tops = margin + np.arange(len(values)) * row_height + row_height * 0.15
+            bottoms = tops + row_height * 0.7
+
+            # the style color is compiled in drawing order already, only given colors are inked
+            bar_colors = [self.ink(c) for c in self.per_item(colors, len(values), None)] if colors is not None else [self.style._line_color] * len(values)
+
+            canvas = ImageDraw.Draw(panel)
+
+            for top, bottom, length, color in zip(tops.tolist(), bottoms.tolist(), lengths.tolist(), bar_colors):
+                if length >= 1:
+                    canvas.rectangle([bar_left, top, bar_left + length, bottom], fill=color)
+
+            if show_values:
+                for top, length, value in zip(tops.tolist(), lengths.tolist(), values.tolist()):
+                    canvas.text((bar_left + length + 4, top), f"{value:.2f}", font=font, fill=foreground)
+
+        return self.attach_panel(image, panel, side)
 
     @convert_to_PIL
-    @not_implemented
-    def side_plot(self, image, text, side = "right", apply_style = None):
+    def side_plot(self, image, values, side = "right", size = 300, min_value = None, max_value = None, colors = None, thickness = None, margin = 10, apply_style = None):
 
-        pass
+        # values: one series, or a (series, samples) array drawn as one sparkline each
+
+        series = np.asarray(values, dtype=np.float32)
+        series = series[None] if series.ndim == 1 else series
+
+        with self.temp_style(apply_style):
+
+            panel_size = self.panel_size(image, side, size)
+            foreground = self.panel_colors()[1]
+
+            left, top = margin, margin
+            right, bottom = panel_size[0] - margin, panel_size[1] - margin
+
+            def draw_axes(canvas):
+                canvas.line([left, top, left, bottom, right, bottom], fill=foreground, width=1)
+
+            panel = self.panel_background(("plot", panel_size, image.mode, self.style, margin), panel_size, image.mode, draw_axes)
+
+            if series.size == 0:
+                return self.attach_panel(image, panel, side)
+
+            low = np.nanmin(series) if min_value is None else min_value
+            high = np.nanmax(series) if max_value is None else max_value
+            scale = (bottom - top) / (high - low) if high > low else 0.0
+
+            # every sample of every series is mapped to panel coordinates in one go
+
+            samples = series.shape[1]
+            xs = left + np.arange(samples) * ((right - left) / max(samples - 1, 1))
+            ys = bottom - (np.clip(series, low, high) - low) * scale
+
+            coords = np.stack([np.broadcast_to(xs, ys.shape), ys], axis=-1)
+
+            # one series takes the style color (already in drawing order), several the palette
+
+            if colors is not None:
+                line_colors = [self.ink(c) for c in self.per_item(colors, len(series), None)]
+            elif len(series) == 1:
+                line_colors = [self.style._line_color]
+            else:
+                line_colors = [self.ink(tuple(c)) for c in self.default_palette(len(series)).tolist()]
+
+            real_thickness = thickness if thickness is not None else (self.style._line_thickness or 1)
+
+            canvas = ImageDraw.Draw(panel)
+
+            for line, color in zip(coords, line_colors):
+                canvas.line(line.reshape(-1).tolist(), fill=color, width=real_thickness)
+
+        return self.attach_panel(image, panel, side)
 
     @convert_to_PIL
     def mask(self, image, mask_show = None, color = None, apply_style = None):
 
-        mask_show = mask_show.convert("L")
+        # dense, COCO RLE and bit-packed masks are all decoded within their bounding box only
+
+        decoded = decode_mask(mask_show)
 
-        if isinstance(mask_show, np.ndarray):
-            mask_show = Image.fromarray(mask_show)
+        if decoded is None:
+            return image
+
+        crop, offset = decoded
+
+        with self.temp_style(apply_style):
 
-        mask_real_color = color if color is not None else self.style._mask_color
+            mask_real_color = self.ink(color) if color is not None else self.style._mask_color
 
-        mask_color = Image.new('RGB', mask_show.size, mask_real_color)
+        # same blend as compositing a solid color layer, but done in place on the mask's region
 
-        image = Image.composite(mask_color, image, mask_show)
+        image.paste(mask_real_color, offset + (offset[0] + crop.shape[1], offset[1] + crop.shape[0]), Image.fromarray(crop))
 
         return image        
 
+    def default_palette(self, count):
+
+        # spread the instances over the named colors so that neighbouring ids differ
+
+        named = np.array(list(colors.values()), dtype=np.uint8)
+
+        return named[(np.arange(count) * 37) % len(named)]
+
+    def stack_to_labels(self, masks):
+
+        # later instances are drawn on top of earlier ones, 0 is background
+
+        masks = np.asarray(masks, dtype=bool)
+
+        if masks.ndim == 2:
+            masks = masks[None]
+
+        labels = np.zeros(masks.shape[1:], dtype=np.int32)
+
+        for idx, mask in enumerate(masks):
+            labels[mask] = idx + 1
+
+        return labels, len(masks)
+
+    def sparse_labels(self, masks, image_size):
+
+        # label map covering only the union of the instances' bounding boxes
+
+        decoded = [(idx + 1, decode_mask(mask)) for idx, mask in enumerate(masks)]
+        decoded = [(label, crop, offset) for label, item in decoded if item is not None for crop, offset in [item]]
+
+        if not decoded:
+            return None, None
+
+        x0 = min(offset[0] for _, _, offset in decoded)
+        y0 = min(offset[1] for _, _, offset in decoded)
+        x1 = max(offset[0] + crop.shape[1] for _, crop, offset in decoded)
+        y1 = max(offset[1] + crop.shape[0] for _, crop, offset in decoded)
+
+        labels = np.zeros((y1 - y0, x1 - x0), dtype=np.int32)
+
+        for label, crop, offset in decoded:
+            target = labels[offset[1] - y0:offset[1] - y0 + crop.shape[0], offset[0] - x0:offset[0] - x0 + crop.shape[1]]
+            target[crop > 0] = label
+
+        x1, y1 = min(x1, image_size[0]), min(y1, image_size[1])
+
+        # instances lying entirely beyond the frame leave nothing to blend
+        if x1 <= x0 or y1 <= y0:
+            return None, None
+
+        return labels[:y1 - y0, :x1 - x0], (x0, y0, x1, y1)
+
+    def label_region(self, image, masks, label_map):
+
+        # (labels, region, count): an instance-id map cropped to the region the instances cover
+
+        if label_map is None and isinstance(masks, (list, tuple)):
+            labels, region = self.sparse_labels(masks, image.size)
+            return labels, region, len(masks)
+
+        if label_map is None:
+            label_map, count = self.stack_to_labels(masks)
+        else:
+            label_map = np.asarray(label_map)
+            count = int(label_map.max()) if label_map.size else 0
+
+        if count == 0:
+            return None, None, 0
+
+        rows = np.flatnonzero(label_map.any(axis=1))
+        cols = np.flatnonzero(label_map.any(axis=0))
+
+        region = (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1)
+
+        return label_map[region[1]:region[3], region[0]:region[2]], region, count
+
+    def blend_labels(self, image, labels, region, count, palette, alpha):
+
+        # lookup tables indexed by instance id, row 0 is the untouched background
+
+        palette = np.asarray(palette, dtype=np.uint8) if palette is not None else self.default_palette(count)
+        palette = palette[np.arange(count) % len(palette)]
+
+        if self.channel_order == "BGR":
+            palette = np.concatenate([palette[:, 2::-1], palette[:, 3:]], axis=1)
+
+        color_lut = np.zeros((count + 1, 3), dtype=np.float32)
+        color_lut[1:] = palette[:, :3]
+
+        alpha_lut = np.zeros(count + 1, dtype=np.float32)
+        alpha_lut[1:] = palette[:, 3] / 255.0 if palette.shape[1] == 4 else np.broadcast_to(alpha, (count,))
+
+        # only the region covered by some instance is read, blended and written back
+
+        crop = np.array(image.crop(region))
+        pixels = crop[..., :3].astype(np.float32)
+
+        weights = alpha_lut[labels][..., None]
+        crop[..., :3] = pixels + (color_lut[labels] - pixels) * weights + 0.5
+
+        image.paste(Image.fromarray(crop), region[:2])
+
+        return image
+
+    @convert_to_PIL
+    def masks(self, image, masks = None, label_map = None, palette = None, alpha = 0.5, apply_style = None):
+
+        labels, region, count = self.label_region(image, masks, label_map)
+
+        if count == 0 or region is None:
+            return image
+
+        return self.blend_labels(image, labels, region, count, palette, alpha)
+
+    def outline_labels(self, labels, thickness):
+
+        # a pixel stays in the core while its 4 neighbours carry the same id; whatever
+        # is peeled off in `thickness` rounds is the outline, computed for all instances at once
+
+        padded = np.pad(labels, 1)
+
+        core = padded > 0
+
+        same_up = padded[1:] == padded[:-1]
+        same_left = padded[:, 1:] == padded[:, :-1]
+
+        for _ in range(thickness):
+
+            eroded = core.copy()
+
+            eroded[1:] &= core[:-1] & same_up
+            eroded[:-1] &= core[1:] & same_up
+            eroded[:, 1:] &= core[:, :-1] & same_left
+            eroded[:, :-1] &= core[:, 1:] & same_left
+
+            core = eroded
+
+        outline = (padded > 0) & ~core
+
+        return np.where(outline, padded, 0)[1:-1, 1:-1]
+
+    @convert_to_PIL
+    def mask_outlines(self, image, masks = None, label_map = None, thickness = None, palette = None, alpha = 1.0, apply_style = None):
+
+        labels, region, count = self.label_region(image, masks, label_map)
+
+        if count == 0 or region is None:
+            return image
+
+        with self.temp_style(apply_style):
+            real_thickness = thickness if thickness is not None else (self.style._line_thickness or 1)
+
+        return self.blend_labels(image, self.outline_labels(labels, real_thickness), region, count, palette, alpha)
+
+    def heat_indices(self, heat, vmin, vmax):
+
+        heat = np.asarray(heat, dtype=np.float32)
+
+        if not np.isfinite(heat).any():
+            return None
+
+        low = np.nanmin(heat) if vmin is None else vmin
+        high = np.nanmax(heat) if vmax is None else vmax
+
+        scale = 255.0 / (high - low) if high > low else 0.0
+
+        indices = np.nan_to_num((heat - low) * scale, nan=0.0)
+
+        return np.clip(indices, 0, 255).astype(np.uint8)
+
+    @convert_to_PIL
+    def heatmap(self, image, heat = None, colormap = "jet", alpha = 0.5, vmin = None, vmax = None, threshold = None, alpha_by_value = False, resample = Image.BILINEAR, apply_style = None):
+
+        # the float map is quantized to 8 bit lookup indices first; low resolution maps are
+        # upsampled as a single uint8 channel, before any color is looked up
+
+        indices = self.heat_indices(heat, vmin, vmax)
+
+        if indices is None:
+            return image
+
+        if indices.shape[::-1] != image.size:
+            indices = np.asarray(Image.fromarray(indices).resize(image.size, resample))
+
+        lut = get_colormap(colormap)
+
+        if self.channel_order == "BGR":
+            lut = lut[:, ::-1]
+
+        # per-index blending weight in 1/256 steps, so the blend stays in integer arithmetic
+
+        weights = np.full(256, alpha, dtype=np.float32)
+
+        if alpha_by_value:
+            weights *= np.arange(256) / 255.0
+
+        if threshold is not None:
+            weights[:int(np.ceil(threshold * 255))] = 0
+
+        weights = np.round(weights * 256).astype(np.uint16)
+
+        frame = np.array(image)
+        pixels = frame[..., :3].astype(np.uint16)
+
+        weight = weights[indices][..., None]
+        frame[..., :3] = (pixels * (256 - weight) + lut[indices].astype(np.uint16) * weight) >> 8
+
+        image.paste(Image.fromarray(frame))
+
+        return image
+
     @convert_to_PIL
     def polygon(self, image, points = None, draw_points = False, normalized = False, apply_style = None):
 
+        points = self.prepare_points(points, image, normalized).reshape(-1, 2)
+
         canvas = ImageDraw.Draw(image)
 
         with self.temp_style(apply_style):
 
-            points_tuples = [tuple(p) for p in points]
-
-            canvas.polygon(points_tuples, fill=self.style._box_fill_color)
+            canvas.polygon(points.reshape(-1).tolist(), fill=self.style._box_fill_color)
 
-            list_of_points = list(points) + points[:2]
+            # the outline runs past the first vertex again so that the closing joint is rounded too
+            outline = np.concatenate([points, points[:2]])
 
-            canvas.line([item for sublist in list_of_points for item in sublist], fill=self.style._line_color, width=self.style._line_thickness, joint = "curve")
+            canvas.line(outline.reshape(-1).tolist(), fill=self.style._line_color, width=self.style._line_thickness, joint = "curve")
 
             if draw_points:
                 image = self.keypoints(image, points)
@@ -479,6 +1617,116 @@ class Drawer:
         return image
 
 
+    def ragged_points(self, points, offsets):
+
+        # (M x 2 vertices, P + 1 boundaries) from a flat buffer and its polygon starts or
+        # boundaries, or from a list of vertex arrays
+
+        if offsets is None:
+
+            polygons = [np.asarray(polygon, dtype=np.float64).reshape(-1, 2) for polygon in points]
+
+            points = np.concatenate(polygons) if polygons else np.zeros((0, 2))
+            offsets = np.cumsum([0] + [len(polygon) for polygon in polygons])
+
+            return points, offsets
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        offsets = np.asarray(offsets, dtype=np.int64)
+
+        if len(offsets) == 0 or offsets[-1] != len(points):
+            offsets = np.append(offsets, len(points))
+
+        return points, offsets
+
+    def fill_polygons(self, image, points, offsets, colors):
+
+        rows, starts, ends, polygon = polygon_spans(points, offsets, image.size[0], image.size[1])
+
+        # pixels whose center x lies in [start, end), inside the image
+        starts = np.clip(np.ceil(starts), 0, image.size[0]).astype(np.int64)
+        ends = np.clip(np.ceil(ends), 0, image.size[0]).astype(np.int64)
+
+        keep = ends > starts
+        rows, starts, ends, polygon = rows[keep], starts[keep], ends[keep], polygon[keep]
+
+        if len(rows) == 0:
+            return image
+
+        left, top = int(starts.min()), int(rows.min())
+        width, height = int(ends.max()) - left, int(rows.max()) + 1 - top
+
+        # every span expanded to its flat pixel indices in the covered region
+        lengths = ends - starts
+        flat = np.repeat((rows - top) * width + (starts - left) - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+
+        owners = np.full(width * height, -1, dtype=np.int32)
+
+        if len(colors) == 1:
+            owners[flat] = 0
+        else:
+            # overlapping polygons: the last one is on top
+            np.maximum.at(owners, flat, np.repeat(polygon, lengths).astype(np.int32))
+
+        return self.paste_owners(image, (left, top), (width, height), owners, colors, blend = True)
+
+    @convert_to_PIL
+    def polygons(self, image, points, offsets = None, colors = None, alpha = None, outline_colors = None, thickness = None, dense = False, antialias = False, normalized = False, apply_style = None):
+
+        # many polygons per frame (segmentation contours, lane markings): a flat M x 2
+        # vertex buffer plus the boundaries of each polygon in it (P starts or P + 1
+        # boundaries), or a list of vertex arrays. All the fills are rasterized by one
+        # even-odd scanline pass into a single overlay blended with per-polygon colors and
+        # alpha (0..1, overriding the colors' own). Outlines are drawn on one canvas, or all
+        # at once by the segment rasterizer when dense (many-vertex contours) or
+        # antialiased. thickness 0 disables the outlines
+
+        points, offsets = self.ragged_points(points, offsets)
+        points = self.prepare_points(points, image, normalized).reshape(-1, 2)
+
+        count = len(offsets) - 1
+
+        if count == 0:
+            return image
+
+        with self.temp_style(apply_style):
+
+            if colors is not None or self.style._box_fill_color is not None:
+
+                fills = self.color_table(colors, count, self.style._box_fill_color)
+
+                if alpha is not None:
+                    alpha = np.asarray(alpha, dtype=np.float64)
+                    fills = np.repeat(fills, count, axis=0) if len(fills) == 1 and alpha.ndim > 0 else fills.copy()
+                    fills[:, 3] = np.round(np.clip(alpha, 0.0, 1.0) * 255)
+
+                image = self.fill_polygons(image, points, offsets, fills)
+
+            real_thickness = thickness if thickness is not None else self.style._line_thickness
+
+            if real_thickness and (outline_colors is not None or self.style._line_color is not None):
+
+                outlines = self.color_table(outline_colors, count, self.style._line_color)
+
+                if dense or antialias:
+
+                    edges, owner = polygon_edges(points, offsets)
+                    outlines = outlines[owner] if len(outlines) > 1 else outlines
+
+                    return self.rasterize_segments(image, edges, outlines, real_thickness, antialias)
+
+                canvas = ImageDraw.Draw(image)
+
+                fills = [tuple(color) for color in outlines.tolist()]
+                fills = fills * count if len(fills) == 1 else fills
+
+                # closed past the first vertex again, as in polygon, so that every joint is rounded
+                for vertices, fill in zip(np.split(points, offsets[1:-1]), fills):
+                    if len(vertices):
+                        canvas.line(np.concatenate([vertices, vertices[:2]]).reshape(-1).tolist(), fill=fill, width=real_thickness, joint = "curve")
+
+        return image
+
     def rotate_origin_only(self, xy, radians):
         
         x, y = xy
@@ -489,8 +1737,7 @@ class Drawer:
 
     def arrowhead(self, image, points, filled, length):
 
-        p1 = np.array(points[0])
-        p2 = np.array(points[1])
+        p1, p2 = np.asarray(points, dtype=np.float64).reshape(2, 2)
 
         direction = (p1 - p2) / np.linalg.norm(p1 - p2)
 
@@ -503,9 +1750,9 @@ class Drawer:
 
         if filled:
             canvas = ImageDraw.Draw(image)
-            canvas.polygon([tuple(p2),tuple(p2+p3),tuple(p2+p4)], fill=self.style._line_color)
+            canvas.polygon(np.stack([p2, p2 + p3, p2 + p4]).reshape(-1).tolist(), fill=self.style._line_color)
         else:
-            tips = [[*p2, *(p2+p3)], [*p2, *(p2+p4)]]
+            tips = np.stack([np.concatenate([p2, p2 + p3]), np.concatenate([p2, p2 + p4])])
             image = self.segments(image, tips)
 
         return image
@@ -513,29 +1760,182 @@ class Drawer:
     @convert_to_PIL
     def arrow(self, image, points = None, filled = False, tip_length = 25, normalized = False, apply_style = None):
 
+        points = self.prepare_points(points, image, normalized).reshape(2, 2)
+
         with self.temp_style(apply_style):
 
-            image = self.segments(image, [[*points[0], *points[1]]])
+            image = self.segments(image, points.reshape(1, 4))
             image = self.arrowhead(image, points, filled, tip_length)
 
         return image
 
+    def flow_arrows(self, field, image_size, step):
+
+        # H x W x 2 field sampled at the centers of a step x step grid, as N x 4 arrows
+        # in image coordinates (the field may be at a lower resolution than the image)
+
+        field = np.asarray(field, dtype=np.float64)
+
+        rows = np.arange(step // 2, field.shape[0], step)
+        cols = np.arange(step // 2, field.shape[1], step)
+
+        vectors = field[rows[:, None], cols[None, :]].reshape(-1, 2)
+        origins = np.stack(np.meshgrid(cols, rows), axis=-1).reshape(-1, 2).astype(np.float64)
+
+        ratio = np.array([image_size[0] / field.shape[1], image_size[1] / field.shape[0]])
+
+        return np.concatenate([origins, origins + vectors], axis=1) * np.tile(ratio, 2)
+
+    def arrowheads(self, arrows, tip_length, tip_ratio):
+
+        # the two barbs of every arrow, as in arrowhead: the reversed shaft direction
+        # rotated by +-0.4 rad, tip_length long (or tip_ratio of the shaft if not given)
+
+        tips = arrows[:, 2:]
+        back = arrows[:, :2] - tips
+
+        length = np.hypot(back[:, 0], back[:, 1])[:, None]
+        size = tip_length if tip_length is not None else tip_ratio * length
+
+        back = back / np.maximum(length, 1e-9) * size
+
+        cos, sin = math.cos(0.4), math.sin(0.4)
+
+        left = np.stack([back[:, 0] * cos + back[:, 1] * sin, -back[:, 0] * sin + back[:, 1] * cos], axis=1)
+        right = np.stack([back[:, 0] * cos - back[:, 1] * sin, back[:, 0] * sin + back[:, 1] * cos], axis=1)
+
+        return np.concatenate([tips, tips + left], axis=1), np.concatenate([tips, tips + right], axis=1)
+
+    @convert_to_PIL
+    def quiver(self, image, vectors, step = 16, scale = 1.0, threshold = 0.0, colormap = None, vmax = None, tip_length = None, tip_ratio = 0.3, thickness = None, antialias = False, normalized = False, apply_style = None):
+
+        # vectors: an H x W x 2 field (optical flow, motion vectors) subsampled every step
+        # pixels, or N x 4 arrows (x1, y1, x2, y2). Arrows shorter than threshold are dropped
+        # before any drawing; colormap colors the rest by length. Shafts and barbs of all
+        # the arrows are drawn in a single rasterizer pass, or one by one for a few
+        # hard-edged arrows (see draw_segments)
+
+        vectors = np.asarray(vectors, dtype=np.float64)
+
+        if vectors.ndim == 3:
+            arrows = self.flow_arrows(vectors, image.size, step)
+        else:
+            arrows = self.prepare_points(vectors, image, normalized).reshape(-1, 4)
+
+        magnitude = np.hypot(arrows[:, 2] - arrows[:, 0], arrows[:, 3] - arrows[:, 1])
+        keep = (magnitude > 0) & (magnitude >= threshold)
+
+        arrows, magnitude = arrows[keep], magnitude[keep]
+
+        if len(arrows) == 0:
+            return image
+
+        # the shafts are lengthened from their origin
+        arrows[:, 2:] = arrows[:, :2] + (arrows[:, 2:] - arrows[:, :2]) * scale
+
+        # field arrows are laid out in pixels already, only the transform applies
+        if vectors.ndim == 3:
+            arrows = self.transform_points(arrows)
+
+        with self.temp_style(apply_style):
+
+            if colormap is not None:
+                colors = self.color_table(get_colormap(colormap)[self.heat_indices(magnitude, 0.0, vmax)], len(arrows), None)
+            else:
+                colors = self.color_table(None, len(arrows), self.style._line_color)
+
+            left, right = self.arrowheads(arrows, tip_length, tip_ratio)
+
+            # shaft, left barb, right barb of each arrow in a row, so that arrows stack in order
+            segments = np.stack([arrows, left, right], axis=1).reshape(-1, 4)
+            colors = np.repeat(colors, 3, axis=0) if len(colors) > 1 else colors
+
+            real_thickness = thickness if thickness is not None else self.style._line_thickness
+
+            return self.draw_segments(image, segments, colors, real_thickness, antialias)
+
     @convert_to_PIL
     def skeleton(self, image, joints = None, bones = None, labels = None, font_size = None, normalized = False, apply_style = None):
 
-        real_bones = list()
+        joints = self.prepare_points(joints, image, normalized).reshape(-1, 2)
+
+        # one gather builds every bone's x1, y1, x2, y2 row
+        bones = self.topology(bones).bones
+        real_bones = joints[bones].reshape(-1, 4)
 
         with self.temp_style(apply_style):
-        
-            for bone in bones:
-                if bone is not None:
-                    real_bones.append([*joints[bone[0]],*joints[bone[1]]])
 
             image = self.segments(image, real_bones)
             image = self.keypoints(image, joints, labels, font_size = font_size)
 
         return image
         
+    def topology(self, bones):
+
+        return bones if isinstance(bones, SkeletonTopology) else SkeletonTopology(bones)
+
+    @convert_to_PIL
+    def skeletons(self, image, people, topology, threshold = 0.0, thickness = None, draw_joints = True, dense = False, antialias = False, normalized = False, apply_style = None):
+
+        # people: P x J x 2, or P x J x 3 with a confidence per joint; joints below threshold
+        # (or not finite) are skipped along with their bones. Every bone of every person is
+        # gathered with one index and drawn in a single pass on one canvas, or through the
+        # segment rasterizer and point sprites when dense (very large crowds) or antialiased.
+        # topology: a SkeletonTopology, or a bones list compiled here
+
+        topology = self.topology(topology)
+
+        people = np.asarray(people, dtype=np.float64)
+        people = people.reshape((1,) + people.shape) if people.ndim == 2 else people
+
+        joints = self.prepare_points(people[..., :2], image, normalized)
+
+        valid = np.isfinite(joints).all(axis=-1)
+
+        if people.shape[-1] > 2:
+            valid &= people[..., 2] >= threshold
+
+        # P x B x 2 joints x 2 coordinates, flattened to one x1, y1, x2, y2 row per limb
+        limbs = joints[:, topology.bones].reshape(-1, 4)
+        drawn = (valid[:, topology.bones[:, 0]] & valid[:, topology.bones[:, 1]]).reshape(-1)
+
+        limbs, joints = limbs[drawn], joints[valid]
+
+        with self.temp_style(apply_style):
+
+            if topology.colors is not None:
+                colors = np.tile(self.color_table(topology.colors, len(topology), None), (len(people), 1))[drawn]
+            else:
+                colors = self.color_table(None, 1, self.style._line_color)
+
+            real_thickness = thickness if thickness is not None else self.style._line_thickness
+
+            if dense or antialias:
+
+                if len(limbs):
+                    image = self.rasterize_segments(image, limbs, colors, real_thickness, antialias)
+
+                if draw_joints and len(joints):
+                    image = self.stamp_points(image, joints)
+
+                return image
+
+            canvas = ImageDraw.Draw(image)
+            fills = [tuple(color) for color in colors.tolist()]
+            fills = fills * len(limbs) if len(fills) == 1 else fills
+
+            for limb, fill in zip(limbs.tolist(), fills):
+                canvas.line(limb, fill=fill, width=real_thickness)
+
+            if draw_joints:
+
+                size = self.style._points_size
+
+                for x_coord, y_coord in self.point_centers(joints).tolist():
+                    canvas.ellipse(self.get_circle(x_coord, y_coord, size), fill=self.style._points_color, outline=self.style._points_outline_color, width=self.style._points_outline_thickness)
+
+        return image
+
     @convert_to_PIL
     def arrow_and_text(self, image, label, offset_x, offset_y, points, normalized = False, apply_style = None):
 
@@ -543,10 +1943,18 @@ class Drawer:
 
     def show(self, image, draw_axis = False):
 
+        # imported here so that headless workers never pay for matplotlib and its backend probe
+
+        import matplotlib.pyplot as plt
+
         plt.imshow(image)
 
         if not draw_axis:
             plt.axis('off')
             plt.tight_layout()
 
-        plt.show()
\ No newline at end of file
+        plt.show()
+
+# every drawing primitive of Drawer, forwarded by AsyncDrawer and recorded by DisplayList
+
+PRIMITIVES = tuple(name for name, member in vars(Drawer).items() if getattr(member, "primitive", False))
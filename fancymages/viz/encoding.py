@@ -0,0 +1,118 @@
+
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+from io import BytesIO
+import threading
+import time
+
+# ----------------------------------------
+
+PRESETS = {"JPEG": {"fast": {"quality": 75, "subsampling": 2},
+                    "balanced": {"quality": 85, "subsampling": 2},
+                    "small": {"quality": 80, "subsampling": 2, "optimize": True, "progressive": True},
+                    "quality": {"quality": 95, "subsampling": 0}},
+           "PNG": {"fast": {"compress_level": 1},
+                   "balanced": {"compress_level": 6},
+                   "small": {"compress_level": 9, "optimize": True},
+                   "quality": {"compress_level": 6}},
+           "WEBP": {"fast": {"quality": 75, "method": 0},
+                    "balanced": {"quality": 80, "method": 4},
+                    "small": {"quality": 75, "method": 6},
+                    "quality": {"quality": 95, "method": 4}}}
+
+ALIASES = {"JPG": "JPEG"}
+
+EncodedFrame = namedtuple("EncodedFrame", ["data", "format", "draw_time", "encode_time"])
+
+class BufferPool:
+
+
+    def __init__(self, max_buffers = 8):
+
+        self.max_buffers = max_buffers
+        self.buffers = list()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+
+        with self.lock:
+            buffer = self.buffers.pop() if self.buffers else BytesIO()
+
+        buffer.seek(0)
+
+        return buffer
+
+    def release(self, buffer):
+
+        with self.lock:
+            if len(self.buffers) < self.max_buffers:
+                self.buffers.append(buffer)
+
+class Encoder:
+
+
+    def __init__(self, format = "JPEG", preset = "fast", max_buffers = 8, **save_kwargs):
+
+        self.format = ALIASES.get(format.upper(), format.upper())
+
+        if self.format not in PRESETS:
+            raise ValueError(f"unsupported format {format}, use one of {', '.join(PRESETS)}")
+
+        if preset not in PRESETS[self.format]:
+            raise ValueError(f"unknown preset {preset}, use one of {', '.join(PRESETS[self.format])}")
+
+        self.preset = preset
+        self.save_kwargs = dict(PRESETS[self.format][preset], **save_kwargs)
+
+        self.pool = BufferPool(max_buffers)
+
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.total_time = 0.0
+
+    def prepare(self, image):
+
+        if self.format == "JPEG" and image.mode not in ("RGB", "L"):
+            return image.convert("RGB")
+
+        return image
+
+    def encode(self, image, draw_time = None):
+
+        start = time.perf_counter()
+
+        buffer = self.pool.acquire()
+
+        try:
+
+            self.prepare(image).save(buffer, self.format, **self.save_kwargs)
+
+            # only the bytes written for this frame, the buffer keeps its capacity for the next one
+            size = buffer.tell()
+            buffer.seek(0)
+            data = buffer.read(size)
+
+        finally:
+            self.pool.release(buffer)
+
+        encode_time = time.perf_counter() - start
+
+        with self.lock:
+            self.frames += 1
+            self.total_time += encode_time
+
+        return EncodedFrame(data, self.format, draw_time, encode_time)
+
+    def encode_batch(self, images, max_workers = 4):
+
+        # Pillow releases the GIL while encoding, so threads are enough here
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.encode, images))
+
+    def stats(self):
+
+        with self.lock:
+            return {"frames": self.frames,
+                    "encode time": self.total_time,
+                    "mean encode time": self.total_time / self.frames if self.frames else 0.0}
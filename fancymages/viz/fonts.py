@@ -0,0 +1,124 @@
+
+from PIL import ImageFont
+from collections import OrderedDict
+import threading
+
+# ----------------------------------------
+
+DEFAULT_FONT = "arial"
+
+class FontRegistry:
+
+
+    def __init__(self, max_fonts = 64, max_texts = 4096, logger = None):
+
+        self.max_fonts = max_fonts
+        self.max_texts = max_texts
+        self.logger = logger
+
+        self.fonts = OrderedDict()
+        self.text_boxes = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.text_hits = 0
+        self.text_misses = 0
+
+        self.lock = threading.Lock()
+        self.missing = set()
+
+    def load(self, font, size):
+
+        try:
+            return ImageFont.truetype(font, size)
+        except OSError:
+
+            if font not in self.missing:
+                self.missing.add(font)
+                if self.logger is not None:
+                    self.logger.warning(f"font {font} not found, using the default one")
+
+            return ImageFont.load_default(size)
+
+    def get_font(self, font = None, size = 12):
+
+        key = (font if font is not None else DEFAULT_FONT, size)
+
+        with self.lock:
+
+            if key in self.fonts:
+                self.hits += 1
+                self.fonts.move_to_end(key)
+                return self.fonts[key]
+
+            self.misses += 1
+
+        loaded = self.load(*key)
+
+        with self.lock:
+
+            self.fonts[key] = loaded
+
+            while len(self.fonts) > self.max_fonts:
+                self.fonts.popitem(last=False)
+
+        return loaded
+
+    def text_bbox(self, font, text):
+
+        key = (getattr(font, "path", None), getattr(font, "size", id(font)), text)
+
+        with self.lock:
+
+            if key in self.text_boxes:
+                self.text_hits += 1
+                self.text_boxes.move_to_end(key)
+                return self.text_boxes[key]
+
+            self.text_misses += 1
+
+        bbox = font.getbbox(text)
+
+        with self.lock:
+
+            self.text_boxes[key] = bbox
+
+            while len(self.text_boxes) > self.max_texts:
+                self.text_boxes.popitem(last=False)
+
+        return bbox
+
+    def text_size(self, font, text):
+
+        # width and height measured from the drawing origin, as the old getsize() did
+
+        _, _, right, bottom = self.text_bbox(font, text)
+
+        return right, bottom
+
+    def stats(self):
+
+        with self.lock:
+
+            return {"fonts": len(self.fonts),
+                    "font hits": self.hits,
+                    "font misses": self.misses,
+                    "texts": len(self.text_boxes),
+                    "text hits": self.text_hits,
+                    "text misses": self.text_misses}
+
+    def clear(self):
+
+        with self.lock:
+
+            self.fonts.clear()
+            self.text_boxes.clear()
+
+            self.hits = 0
+            self.misses = 0
+            self.text_hits = 0
+            self.text_misses = 0
+
+# process-wide registry shared by every Drawer
+
+font_registry = FontRegistry()
@@ -0,0 +1,244 @@
+
+from PIL import Image, ImageDraw
+import numpy as np
+import struct
+import zlib
+import os
+
+from fancymages.viz.fonts import font_registry, DEFAULT_FONT
+from fancymages.utils.processing import resolve_color
+
+# ----------------------------------------
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+PNG_COLOR_TYPES = {"L": 0, "RGB": 2, "RGBA": 6}
+
+class PNGStreamWriter:
+
+
+    def __init__(self, file, width, height = None, mode = "RGB", compress_level = 6, chunk_size = 1 << 16):
+
+        # rows are compressed and written as they come, nothing but the pending compressed
+        # bytes is kept in memory. With an unknown height the file must be seekable: the
+        # header is written with height 0 and patched on close
+
+        self.own_file = isinstance(file, (str, os.PathLike))
+        self.file = open(file, "wb") if self.own_file else file
+
+        if height is None and not self.file.seekable():
+            raise ValueError("the height must be known up front when writing to a non-seekable stream")
+
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.rows = 0
+
+        self.compressor = zlib.compressobj(compress_level)
+        self.pending = list()
+        self.pending_size = 0
+        self.chunk_size = chunk_size
+
+        self.file.write(PNG_SIGNATURE)
+        self.header_offset = self.file.tell()
+        self.write_chunk(b"IHDR", self.header(height or 0))
+
+    def header(self, height):
+
+        return struct.pack(">IIBBBBB", self.width, height, 8, PNG_COLOR_TYPES[self.mode], 0, 0, 0)
+
+    def write_chunk(self, kind, data):
+
+        self.file.write(struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data)))
+
+    def write_rows(self, rows):
+
+        # rows: H x W (x channels) uint8 array or image of the writer's mode and width
+
+        rows = np.asarray(rows.convert(self.mode) if isinstance(rows, Image.Image) else rows, dtype=np.uint8)
+        rows = rows.reshape(len(rows), -1)
+
+        if rows.shape[1] != self.width * len(self.mode):
+            raise ValueError(f"rows of {rows.shape[1]} bytes given for a {self.width} px wide {self.mode} image")
+
+        # filter type 0 (none) in front of every scanline
+        scanlines = np.concatenate([np.zeros((len(rows), 1), dtype=np.uint8), rows], axis=1)
+
+        self.push(self.compressor.compress(scanlines.tobytes()))
+        self.rows += len(rows)
+
+    def push(self, data):
+
+        self.pending.append(data)
+        self.pending_size += len(data)
+
+        if self.pending_size >= self.chunk_size:
+            self.flush_chunk()
+
+    def flush_chunk(self):
+
+        if self.pending_size:
+            self.write_chunk(b"IDAT", b"".join(self.pending))
+
+        self.pending = list()
+        self.pending_size = 0
+
+    def close(self):
+
+        if self.compressor is None:
+            return
+
+        if self.height is not None and self.rows != self.height:
+            raise ValueError(f"{self.rows} rows written for a height of {self.height}")
+
+        self.push(self.compressor.flush())
+        self.flush_chunk()
+        self.write_chunk(b"IEND", b"")
+
+        self.compressor = None
+
+        if self.height is None:
+
+            end = self.file.tell()
+
+            self.file.seek(self.header_offset)
+            self.write_chunk(b"IHDR", self.header(self.rows))
+            self.file.seek(end)
+
+        if self.own_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+def load_thumbnail(source, size):
+
+    # (thumbnail, (x scale, y scale)) of a path, file, image or array fitted into size;
+    # JPEG files are decoded straight at a reduced scale, never at full resolution
+
+    if isinstance(source, np.ndarray):
+        image = Image.fromarray(source)
+    elif isinstance(source, Image.Image):
+        image = source
+    else:
+        image = Image.open(source)
+
+    original = image.size
+
+    if image is not source:
+        image.draft("RGB", size)
+    else:
+        image = image.copy()
+
+    image = image.convert("RGB")
+    image.thumbnail(size, Image.BILINEAR, reducing_gap = 2.0)
+
+    return image, (image.size[0] / original[0], image.size[1] / original[1])
+
+class MosaicWriter:
+
+
+    def __init__(self, path, columns, tile_size = (256, 256), spacing = 4, background = "black", count = None, caption_size = 12, caption_color = "white", compress_level = 6):
+
+        # a contact sheet written to a PNG file one row of tiles at a time: memory holds a
+        # single row strip and the tile being rendered, however many tiles are added.
+        # count: the number of tiles if known, otherwise the height is patched on close
+
+        self.columns = columns
+        self.tile_size = tuple(tile_size)
+        self.spacing = spacing
+        self.background = resolve_color(background)[:3]
+
+        self.caption_font = font_registry.get_font(DEFAULT_FONT, caption_size)
+        self.caption_color = resolve_color(caption_color)[:3]
+
+        self.width = columns * self.tile_size[0] + (columns + 1) * spacing
+        self.row_height = self.tile_size[1] + spacing
+
+        height = None
+
+        if count is not None:
+            rows = max((count + columns - 1) // columns, 1)
+            height = rows * self.row_height + spacing
+
+        self.writer = PNGStreamWriter(path, self.width, height, "RGB", compress_level)
+
+        # the top spacing, then rows of tiles each followed by spacing
+        self.writer.write_rows(self.blank(spacing))
+
+        self.strip = None
+        self.column = 0
+        self.tiles = 0
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+    def blank(self, height):
+
+        return np.broadcast_to(np.array(self.background, dtype=np.uint8), (height, self.width, 3))
+
+    def add(self, source, annotations = None, caption = None):
+
+        # annotations: a DisplayList replayed at thumbnail scale with scaled styles, or a
+        # callable (thumbnail, scale) -> thumbnail, for instance a Drawer chain
+
+        tile, scale = load_thumbnail(source, self.tile_size)
+
+        if annotations is not None:
+            tile = annotations.replay(tile, scale = scale, scale_style = True) if hasattr(annotations, "replay") else annotations(tile, scale)
+
+        if caption is not None:
+            self.draw_caption(tile, caption)
+
+        if self.strip is None:
+            self.strip = Image.new("RGB", (self.width, self.row_height), self.background)
+
+        # each tile is centered in its cell
+        x_coord = self.spacing + self.column * (self.tile_size[0] + self.spacing) + (self.tile_size[0] - tile.size[0]) // 2
+        y_coord = (self.tile_size[1] - tile.size[1]) // 2
+
+        self.strip.paste(tile.convert("RGB"), (x_coord, y_coord))
+
+        self.column += 1
+        self.tiles += 1
+
+        if self.column == self.columns:
+            self.flush_row()
+
+    def draw_caption(self, tile, caption):
+
+        canvas = ImageDraw.Draw(tile)
+
+        width, height = font_registry.text_size(self.caption_font, caption)
+        top = tile.size[1] - height - 4
+
+        canvas.rectangle([0, top, tile.size[0], tile.size[1]], fill=(0, 0, 0))
+        canvas.text(((tile.size[0] - width) // 2, top + 2), caption, font=self.caption_font, fill=self.caption_color)
+
+    def flush_row(self):
+
+        if self.strip is None:
+            return
+
+        self.writer.write_rows(self.strip)
+
+        self.strip = None
+        self.column = 0
+
+    def close(self):
+
+        if self.writer is None:
+            return
+
+        self.flush_row()
+
+        # an empty sheet still gets one blank row, as counted up front
+        if self.tiles == 0:
+            self.writer.write_rows(self.blank(self.row_height))
+
+        self.writer.close()
+        self.writer = None
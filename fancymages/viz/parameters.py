@@ -1,6 +1,24 @@
 
 
-from lib.utils.processing import suggest, similar
+from fancymages.utils.processing import suggest, similar, resolve_color
+from fancymages.viz.fonts import font_registry
+import json
+
+# ----------------------------------------
+
+STYLE_FIELDS = ("_line_color", "_line_thickness", "_line_style",
+                "_text_color", "_text_fill_color", "_text_font_size", "_text_font",
+                "_points_color", "_points_size", "_points_outline_color", "_points_outline_thickness",
+                "_box_fill_color", "_box_text_anchor", "_box_text_inside",
+                "_arrow_color", "_arrow_thickness", "_arrow_angle", "_arrow_fill_color",
+                "_mask_color")
+
+INTEGER_FIELDS = ("_line_thickness", "_text_font_size", "_points_size", "_points_outline_thickness", "_arrow_thickness")
+
+FLOAT_FIELDS = ("_arrow_angle",)
+
+STYLE_PACK_FORMAT = "fancymages-style-pack"
+STYLE_PACK_VERSION = 1
 
 
 class DrawingParams:
@@ -70,6 +88,10 @@ class DrawingParams:
 
         self.initialize(**kwargs)
 
+    def as_dict(self):
+
+        return {name[1:].replace('_', ' '): value for name, value in self.__dict__.items() if name.startswith('_')}
+
 
     # @property
     # def color(self, primitive): 
@@ -131,10 +153,116 @@ class DrawingParams:
     #     else:
     #         raise ValueError("value error")
 
-    def dump_style(self, filename):
+    def compile(self, channel_order = "RGB"):
+
+        return CompiledStyle(self, channel_order)
+
+    def packed(self):
+
+        # fields as stored in a style pack: colors already resolved to RGBA, keyed by attribute name
+
+        return {name: list(resolve_color(value)) if value is not None and name.endswith("_color") else value
+                for name, value in self.__dict__.items() if name in STYLE_FIELDS}
+
+    def unpack(self, fields):
+
+        # a pack was validated when it was written, so fields are assigned directly
+        # instead of going through preprocess() and the fuzzy key matching
 
-        pass
+        for name, value in fields.items():
+
+            if name not in STYLE_FIELDS:
+                raise ValueError(f"unknown field {name} in style pack")
+
+            setattr(self, name, tuple(value) if isinstance(value, list) else value)
+
+    def dump_style(self, filename, style_name = "default"):
+
+        dump_style_pack(filename, {style_name: self})
     
-    def load_style(self, filename):
+    def load_style(self, filename, style_name = None):
+
+        styles = read_style_pack(filename)
+
+        if style_name is None:
+            style_name = next(iter(styles))
+
+        self.unpack(styles[style_name])
+
+
+def dump_style_pack(filename, styles):
+
+    pack = {"format": STYLE_PACK_FORMAT,
+            "version": STYLE_PACK_VERSION,
+            "styles": {name: params.packed() for name, params in styles.items()}}
+
+    with open(filename, "w") as output:
+        json.dump(pack, output)
+
+def read_style_pack(filename):
+
+    with open(filename) as source:
+        pack = json.load(source)
+
+    if pack.get("format") != STYLE_PACK_FORMAT:
+        raise ValueError(f"{filename} is not a style pack")
+
+    if pack.get("version") != STYLE_PACK_VERSION:
+        raise ValueError(f"{filename} has style pack version {pack.get('version')}, expected {STYLE_PACK_VERSION}")
+
+    return pack["styles"]
+
+def load_style_pack(filename, logger):
+
+    styles = dict()
+
+    for name, fields in read_style_pack(filename).items():
+
+        params = DrawingParams(logger, dict())
+        params.unpack(fields)
+
+        styles[name] = params
+
+    return styles
+
+
+class CompiledStyle:
+
+    # immutable snapshot of a DrawingParams, built at add_style/update_style time
+    # so that the drawing primitives never parse colors or load fonts
+
+    __slots__ = STYLE_FIELDS + ("font",)
+
+    def __init__(self, params, channel_order = "RGB"):
+
+        for name in STYLE_FIELDS:
+
+            value = getattr(params, name)
+
+            if value is not None and name.endswith("_color"):
+                value = resolve_color(value)
+                if channel_order == "BGR":
+                    value = (value[2], value[1], value[0], value[3])
+
+            elif value is not None and name in INTEGER_FIELDS:
+                value = self.validate(name, value, int)
+
+            elif value is not None and name in FLOAT_FIELDS:
+                value = self.validate(name, value, float)
+
+            object.__setattr__(self, name, value)
+
+        font = font_registry.get_font(self._text_font, self._text_font_size) if self._text_font_size is not None else None
+
+        object.__setattr__(self, "font", font)
+
+    def validate(self, name, value, kind):
+
+        try:
+            return kind(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"field {name[1:].replace('_', ' ')} must be a number, got {value!r}")
+
+    def __setattr__(self, name, value):
 
-        pass
\ No newline at end of file
+        raise AttributeError("compiled styles are read-only, use Drawer.update_style instead")
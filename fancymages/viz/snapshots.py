@@ -0,0 +1,187 @@
+
+from PIL import Image
+from collections import OrderedDict
+from io import BytesIO
+import itertools
+import threading
+import tempfile
+import shutil
+import os
+
+# ----------------------------------------
+
+class SnapshotStore:
+
+
+    def __init__(self, max_bytes = 512 * 2**20, policy = "lru", compression = None, quality = 90, spill = False):
+
+        if policy not in ("lru", "ring"):
+            raise ValueError("policy must be lru or ring")
+
+        if compression not in (None, "png", "jpeg"):
+            raise ValueError("compression must be None, png or jpeg")
+
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.compression = compression
+        self.quality = quality
+
+        # spill = True uses a fresh temp directory, a string is used as the directory itself
+
+        self.spill_dir = None
+        self.own_spill_dir = False
+        self.spill = spill
+
+        self.entries = OrderedDict()
+        self.spilled = OrderedDict()
+        self.counter = itertools.count()
+
+        self.nbytes = 0
+        self.disk_bytes = 0
+
+        self.lock = threading.RLock()
+
+    def __len__(self):
+
+        return len(self.entries) + len(self.spilled)
+
+    def __iter__(self):
+
+        for key in self.keys():
+            yield self.load(key)
+
+    def keys(self):
+
+        with self.lock:
+            return sorted(list(self.entries.keys()) + list(self.spilled.keys()))
+
+    # ---- encoding
+
+    def encode(self, image):
+
+        if self.compression is None:
+            image = image.copy()
+            return image, image.width * image.height * len(image.getbands())
+
+        buffer = BytesIO()
+
+        if self.compression == "jpeg":
+            image.convert("RGB").save(buffer, "JPEG", quality=self.quality)
+        else:
+            image.save(buffer, "PNG", compress_level=1)
+
+        payload = buffer.getvalue()
+
+        return payload, len(payload)
+
+    def decode(self, payload):
+
+        if isinstance(payload, Image.Image):
+            return payload
+
+        image = Image.open(BytesIO(payload))
+        image.load()
+
+        return image
+
+    # ---- store
+
+    def add(self, image):
+
+        key = next(self.counter)
+
+        payload, nbytes = self.encode(image)
+
+        with self.lock:
+
+            self.entries[key] = (payload, nbytes)
+            self.nbytes += nbytes
+
+            self.evict()
+
+        return key
+
+    def load(self, key):
+
+        with self.lock:
+
+            if key in self.entries:
+
+                if self.policy == "lru":
+                    self.entries.move_to_end(key)
+
+                payload = self.entries[key][0]
+
+            elif key in self.spilled:
+
+                payload = None
+                filename = self.spilled[key][0]
+
+            else:
+                raise KeyError(key)
+
+        if payload is not None:
+            return self.decode(payload)
+
+        image = Image.open(filename)
+        image.load()
+
+        return image
+
+    def evict(self):
+
+        # the newest entry always stays, so the key just returned by add() can be loaded
+        # even when that snapshot alone is over the budget
+
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+
+            key, (payload, nbytes) = self.entries.popitem(last=False)
+            self.nbytes -= nbytes
+
+            if self.spill:
+                self.spill_entry(key, payload)
+
+    def spill_entry(self, key, payload):
+
+        if self.spill_dir is None:
+
+            self.own_spill_dir = not isinstance(self.spill, str)
+            self.spill_dir = self.spill if not self.own_spill_dir else tempfile.mkdtemp(prefix="fancymages-snapshots-")
+
+            os.makedirs(self.spill_dir, exist_ok=True)
+
+        extension = "jpg" if self.compression == "jpeg" else "png"
+        filename = os.path.join(self.spill_dir, f"snapshot-{key:06d}.{extension}")
+
+        if isinstance(payload, Image.Image):
+            payload.save(filename, "PNG", compress_level=1)
+        else:
+            with open(filename, "wb") as output:
+                output.write(payload)
+
+        nbytes = os.path.getsize(filename)
+
+        self.spilled[key] = (filename, nbytes)
+        self.disk_bytes += nbytes
+
+    def clear(self):
+
+        with self.lock:
+
+            for filename, _ in self.spilled.values():
+                if os.path.exists(filename):
+                    os.remove(filename)
+
+            # a temp directory created by the store goes too, a caller's directory stays
+
+            if self.own_spill_dir:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+                self.spill_dir = None
+                self.own_spill_dir = False
+
+            self.entries.clear()
+            self.spilled.clear()
+
+            self.nbytes = 0
+            self.disk_bytes = 0
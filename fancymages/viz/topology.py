@@ -0,0 +1,52 @@
+
+import numpy as np
+
+from fancymages.utils.processing import resolve_color
+
+# ----------------------------------------
+
+# COCO 17 keypoints: nose, eyes, ears, shoulders, elbows, wrists, hips, knees, ankles
+
+COCO_BONES = [(15, 13), (13, 11), (16, 14), (14, 12), (11, 12), (5, 11), (6, 12), (5, 6), (5, 7),
+              (6, 8), (7, 9), (8, 10), (1, 2), (0, 1), (0, 2), (1, 3), (2, 4), (3, 5), (4, 6)]
+
+class SkeletonTopology:
+
+
+    def __init__(self, bones, colors = None, joint_count = None):
+
+        # bones: (joint, joint) pairs, None entries are skipped as in Drawer.skeleton;
+        # colors: one color for all the limbs or one per bone, None for the style's line color
+
+        bones = [bone for bone in bones if bone is not None]
+
+        self.bones = np.array(bones, dtype=np.intp).reshape(-1, 2)
+        self.joint_count = joint_count if joint_count is not None else int(self.bones.max()) + 1 if len(self.bones) else 0
+
+        if (self.bones < 0).any() or (self.bones >= self.joint_count).any():
+            raise ValueError(f"bones reference joints outside 0..{self.joint_count - 1}")
+
+        self.colors = self.compile_colors(colors, len(self.bones))
+
+    @classmethod
+    def coco(cls, colors = None):
+
+        return cls(COCO_BONES, colors, joint_count = 17)
+
+    @staticmethod
+    def compile_colors(colors, count):
+
+        if colors is None:
+            return None
+
+        if isinstance(colors, str) or all(isinstance(c, (int, float)) for c in colors):
+            colors = [colors] * count
+
+        if len(colors) != count:
+            raise ValueError(f"{len(colors)} limb colors given for {count} bones")
+
+        return np.array([resolve_color(color) for color in colors], dtype=np.uint8)
+
+    def __len__(self):
+
+        return len(self.bones)
@@ -0,0 +1,82 @@
+
+import numpy as np
+
+# ----------------------------------------
+
+class CoordinateTransform:
+
+
+    def __init__(self, matrix = None):
+
+        # 3x3 homogeneous matrix mapping input coordinates to pixel coordinates
+
+        self.matrix = np.eye(3) if matrix is None else np.asarray(matrix, dtype=np.float64)
+
+    def __matmul__(self, other):
+
+        # (a @ b) applies b first, then a
+
+        return CoordinateTransform(self.matrix @ other.matrix)
+
+    def then(self, other):
+
+        return other @ self
+
+    def inverse(self):
+
+        return CoordinateTransform(np.linalg.inv(self.matrix))
+
+    @classmethod
+    def scaling(cls, sx, sy = None):
+
+        sy = sx if sy is None else sy
+
+        return cls(np.diag([sx, sy, 1.0]))
+
+    @classmethod
+    def translation(cls, tx, ty):
+
+        matrix = np.eye(3)
+        matrix[:2, 2] = (tx, ty)
+
+        return cls(matrix)
+
+    @classmethod
+    def normalized(cls, width, height):
+
+        return cls.scaling(width, height)
+
+    @classmethod
+    def letterbox(cls, original_size, input_size):
+
+        # undoes a resize-and-pad letterbox: coordinates predicted on the model input
+        # (input_size) are mapped back onto the original image (original_size)
+
+        scale = min(input_size[0] / original_size[0], input_size[1] / original_size[1])
+
+        pad_x = (input_size[0] - original_size[0] * scale) / 2.0
+        pad_y = (input_size[1] - original_size[1] * scale) / 2.0
+
+        return cls.scaling(1.0 / scale) @ cls.translation(-pad_x, -pad_y)
+
+    @classmethod
+    def unwarp(cls, warp):
+
+        # inverse of a 2x3 (or 3x3) affine warp that was applied to the image
+
+        matrix = np.eye(3)
+        warp = np.asarray(warp, dtype=np.float64)
+        matrix[:warp.shape[0], :] = warp
+
+        return cls(np.linalg.inv(matrix))
+
+    def apply(self, points):
+
+        # any array whose last dimension holds interleaved x, y pairs (Nx2, Nx4, PxJx2, ...)
+
+        points = np.asarray(points, dtype=np.float64)
+        pairs = points.reshape(-1, 2)
+
+        mapped = pairs @ self.matrix[:2, :2].T + self.matrix[:2, 2]
+
+        return mapped.reshape(points.shape)
@@ -0,0 +1,41 @@
+from fancymages.viz.drawing import Drawer
+from fancymages.utils.logger import Logger
+
+from PIL import Image
+import timeit
+
+# --------------------------------------
+
+# label rendering only touches the label region, so the timings below
+# should stay roughly flat as the frame resolution grows
+
+resolutions = {"480p": (640, 480),
+               "1080p": (1920, 1080),
+               "4K": (3840, 2160)}
+
+repeats = 200
+
+logger = Logger()
+drawer = Drawer(logger = logger)
+
+drawer.add_style("bench", {"line color": "red",
+                           "line thickness": 3,
+                           "text fill color": "red",
+                           "text font size": 20,
+                           "text color": "white"})
+
+drawer.set_style("bench")
+
+# --- BENCHMARK
+
+print(f"{'resolution':>12} {'box + label':>14} {'text':>14} {'text_anchor':>14}")
+
+for name, size in resolutions.items():
+
+    img = Image.new("RGBA", size)
+
+    box_time = timeit.timeit(lambda: drawer.box(img, (100,100), (300,300), label="person"), number=repeats)
+    text_time = timeit.timeit(lambda: drawer.text(img, coords=(50,50), text_show="label"), number=repeats)
+    anchor_time = timeit.timeit(lambda: drawer.text_anchor(img, text_show="caption"), number=repeats)
+
+    print(f"{name:>12} {box_time/repeats*1e3:>11.3f} ms {text_time/repeats*1e3:>11.3f} ms {anchor_time/repeats*1e3:>11.3f} ms")
@@ -0,0 +1,47 @@
+from fancymages.viz.drawing import Drawer
+from fancymages.utils.logger import Logger
+
+from PIL import Image
+import numpy as np
+import timeit
+
+# --------------------------------------
+
+# per-segment ImageDraw.line calls against the vectorized rasterizer (dense=True),
+# hard-edged and antialiased, on short trajectory-like segments over a 1080p frame;
+# the rasterizer pays a fixed cost for buffers the size of the covered region, so dense
+# hard-edged lines below DENSE_MIN_SEGMENTS (one color) or DENSE_MIN_COLORED_SEGMENTS
+# (one color per segment) go through the loop, and 1000 segments time the same either way
+
+counts = (1000, 10000, 100000)
+size = (1920, 1080)
+repeats = 5
+
+logger = Logger()
+drawer = Drawer(logger = logger)
+
+drawer.add_style("bench", {"line color": "red",
+                           "line thickness": 2})
+
+drawer.set_style("bench")
+
+rng = np.random.default_rng(0)
+
+# --- BENCHMARK
+
+print(f"{'segments':>10} {'loop':>14} {'dense':>14} {'antialias':>14} {'colored':>14}")
+
+for count in counts:
+
+    starts = rng.uniform(0, size, (count, 2))
+    segments = np.concatenate([starts, starts + rng.normal(0, 20, (count, 2))], axis=1)
+    colors = rng.integers(0, 255, (count, 3), dtype=np.uint8)
+
+    img = Image.new("RGB", size)
+
+    loop_time = timeit.timeit(lambda: drawer.segments(img, segments), number=repeats)
+    dense_time = timeit.timeit(lambda: drawer.segments(img, segments, dense=True), number=repeats)
+    aa_time = timeit.timeit(lambda: drawer.segments(img, segments, antialias=True), number=repeats)
+    colored_time = timeit.timeit(lambda: drawer.segments(img, segments, colors=colors, dense=True), number=repeats)
+
+    print(f"{count:>10} {loop_time/repeats*1e3:>11.2f} ms {dense_time/repeats*1e3:>11.2f} ms {aa_time/repeats*1e3:>11.2f} ms {colored_time/repeats*1e3:>11.2f} ms")
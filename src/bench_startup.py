@@ -0,0 +1,52 @@
+import statistics
+import subprocess
+import sys
+import json
+
+# --------------------------------------
+
+# every measurement runs in a fresh interpreter, as a new worker process would
+
+probe = """
+import time, sys, json
+
+start = time.perf_counter()
+
+from fancymages.viz.drawing import Drawer
+from fancymages.utils.logger import Logger
+
+imported = time.perf_counter()
+
+from PIL import Image
+
+drawer = Drawer(logger = Logger())
+drawer.add_style("bench", {"line color": "red", "line thickness": 3, "text fill color": "red", "text font size": 20, "text color": "white"})
+drawer.set_style("bench")
+
+img = drawer.box(Image.new("RGB", (640, 480)), (100,100), (300,300), label="person")
+
+drawn = time.perf_counter()
+
+print(json.dumps({"import": imported - start,
+                  "first draw": drawn - imported,
+                  "matplotlib": "matplotlib" in sys.modules}))
+"""
+
+repeats = 7
+
+# --- BENCHMARK
+
+runs = list()
+
+for _ in range(repeats):
+    output = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True).stdout
+    runs.append(json.loads(output.strip().splitlines()[-1]))
+
+import_time = statistics.median(run["import"] for run in runs)
+draw_time = statistics.median(run["first draw"] for run in runs)
+
+print(f"import fancymages.viz.drawing: {import_time*1e3:8.1f} ms (median of {repeats})")
+print(f"first labelled box:           {draw_time*1e3:8.1f} ms (median of {repeats})")
+
+if any(run["matplotlib"] for run in runs):
+    print("!! matplotlib was imported by a headless render")
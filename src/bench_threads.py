@@ -0,0 +1,77 @@
+from fancymages.viz.drawing import Drawer
+from fancymages.utils.logger import Logger
+
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+import numpy as np
+import time
+import os
+
+# --------------------------------------
+
+# one Drawer shared by every thread; each thread draws with its own style
+# passed through apply_style and checks that no other thread's style leaked in
+
+frames_per_thread = 40
+thread_counts = [1, 2, 4, 8]
+
+logger = Logger()
+drawer = Drawer(logger = logger)
+
+palette = ["red", "green", "blue", "yellow", "orange", "purple", "white", "cyan"]
+
+for idx, color in enumerate(palette):
+    drawer.add_style(f"thread-{idx}", {"line color": color,
+                                       "line thickness": 4,
+                                       "text fill color": color,
+                                       "text font size": 20,
+                                       "text color": "black",
+                                       "mask color": color})
+
+drawer.set_style("thread-0")
+
+mask = np.zeros((1080, 1920), dtype=np.uint8)
+mask[600:900, 1200:1700] = 255
+mask = Image.fromarray(mask)
+
+boxes = np.random.default_rng(0).uniform(0, 1600, (30, 2))
+boxes = np.hstack([boxes, boxes + 200])
+
+def render(thread_idx):
+
+    style_name = f"thread-{thread_idx % len(palette)}"
+    expected = drawer.compiled_styles[style_name]._line_color[:3]
+
+    for _ in range(frames_per_thread):
+
+        img = Image.new("RGB", (1920, 1080))
+
+        img = drawer.mask(img, mask, apply_style = style_name)
+        img = drawer.boxes(img, boxes, labels = "object", apply_style = style_name)
+        img = drawer.text_anchor(img, text_show = style_name, apply_style = style_name)
+
+        # the border of the first box must carry this thread's color
+        pixel = img.getpixel((int(boxes[0, 0]) + 1, int(boxes[0, 1]) + 100))[:3]
+
+        if pixel != expected:
+            raise RuntimeError(f"{style_name}: found {pixel}, expected {expected}")
+
+    return frames_per_thread
+
+# --- BENCHMARK
+
+print(f"cpu count: {os.cpu_count()}")
+
+baseline = None
+
+for threads in thread_counts:
+
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        frames = sum(executor.map(render, range(threads)))
+
+    throughput = frames / (time.perf_counter() - start)
+    baseline = baseline if baseline is not None else throughput
+
+    print(f"{threads:>2} threads: {throughput:7.1f} frames/s ({throughput/baseline:4.2f}x)")